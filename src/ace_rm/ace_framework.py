@@ -7,7 +7,7 @@ All configuration is now centralized in ace_rm.config.
 from ace_rm.memory.core import ACE_Memory  # noqa: F401
 from ace_rm.memory.queue import TaskQueue  # noqa: F401
 from ace_rm.agent.graph import AgentState, build_ace_agent, call_llm_with_retry  # noqa: F401
-from ace_rm.workers.background import BackgroundWorker  # noqa: F401
+from ace_rm.workers.background import BackgroundWorker, SharedBackgroundWorker  # noqa: F401
 
 # Re-exporting configuration constants for backward compatibility
 from ace_rm.config import (  # noqa: F401
@@ -1,25 +1,49 @@
-import json
-import os
+import asyncio
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import List, TypedDict, Optional, Any, Dict
+from typing import Annotated, List, TypedDict, Optional, Any, Dict
 from typing_extensions import NotRequired
 from tenacity import retry, stop_after_attempt, wait_exponential
 
-from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage, AIMessage
+from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage, AIMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig, RunnableLambda
 from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph, END
+from langgraph.graph.message import add_messages
+from langgraph.graph.state import CompiledStateGraph
 from langchain_core.tools import tool
 from langgraph.prebuilt import ToolNode
 
 from ace_rm import prompts
+from ace_rm.agent.schemas import CuratorDraft, CuratorIntent
+from ace_rm.config import CURATOR_FUSED, CURATOR_SKIP_SIMPLE, REFLECT_SKIP_TRIVIAL, STRUCTURED_OUTPUT
 from ace_rm.memory.core import ACE_Memory
 from ace_rm.memory.queue import TaskQueue
 from ace_rm.utils.stm_manager import apply_diff
+from ace_rm.utils.json_utils import parse_llm_json, dumps_compact
+from ace_rm.utils.llm_manager import loop_local_llm
+
+
+# Greetings and acknowledgements: the Curator fast path answers them without intent
+# analysis, and the Reflector can skip them (ACE_REFLECT_SKIP_TRIVIAL).
+_SIMPLE_PATTERNS = [
+    r"^(はい|いいえ|うん|ううん|わかりました|了解|OK|ok|yes|no)\.?$",
+    r"^(ありがとう|thanks|thank you|どうも|サンキュー)",
+    r"^(こんにちは|こんばんは|おはよう|hello|hi|hey)\.?$",
+]
+_SIMPLE_RE = re.compile("|".join(f"(?:{p})" for p in _SIMPLE_PATTERNS), re.IGNORECASE)
+
+# Speaker labels for the Curator's history excerpt; one prompt token each
+# instead of the two to three that message class names cost.
+_ROLE_TAGS = {HumanMessage: "User", AIMessage: "Assistant", SystemMessage: "System", ToolMessage: "Tool"}
 
 
 # --- Agent State ---
 class AgentState(TypedDict):
-    messages: List[BaseMessage]
+    # Nodes return only new messages; add_messages appends them to the history.
+    messages: Annotated[List[BaseMessage], add_messages]
     context_docs: List[str]
     extracted_entities: List[str]
     problem_class: str
@@ -27,202 +51,404 @@ class AgentState(TypedDict):
     stm: NotRequired[Dict[str, Any]]  # Short-Term Memory (response_style, turn_count, etc.)
     lesson_learned: NotRequired[str]
     should_store: NotRequired[bool]
+    draft_answered: NotRequired[bool]  # Set when the fused Curator already answered the turn
 
 @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=5))
 def call_llm_with_retry(llm, messages):
     return llm.invoke(messages)
 
-def build_ace_agent(llm: ChatOpenAI, memory: ACE_Memory, task_queue: Optional[TaskQueue] = None, use_tools: bool = True):
+@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=5))
+async def acall_llm_with_retry(llm, messages):
+    return await llm.ainvoke(messages)
+
+# Key under config["configurable"] holding the AgentDeps of the current run.
+_DEPS_KEY = "ace_deps"
+
+# Runs a speculative retrieval on the raw user input while the Curator's LLM call is in flight.
+retrieval_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="ace-retrieval")
+# Writes Curator analyses to reflector_cache after the turn has moved on, one at a time.
+cache_write_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ace-cache-write")
+
+
+class AgentDeps:
     """
-    Builds the ACE Agent graph.
-    If task_queue is not provided, reflector will not enqueue tasks.
+    Per-agent collaborators (LLM, memory, queue) for the shared compiled graph.
+    Nodes read them from the run config, so one compiled graph serves every
+    session instead of being rebuilt per agent.
+    """
+
+    def __init__(self, llm: ChatOpenAI, memory: ACE_Memory, task_queue: Optional[TaskQueue], use_tools: bool):
+        self.llm = llm
+        self.memory = memory
+        self.task_queue = task_queue
+        self.use_tools = use_tools
+        self.llm_with_tools = llm.bind_tools([search_memory_tool]) if use_tools else llm
+        self.fused_llm = llm.with_structured_output(CuratorDraft) if CURATOR_FUSED else None
+        intent_llm = llm.with_structured_output(CuratorIntent) if STRUCTURED_OUTPUT else None
+        # Structured-output runnables return pydantic models; the plain LLM returns JSON text.
+        self.curator_llm = self.fused_llm or intent_llm or llm
+        self._loop_deps: Optional["AgentDeps"] = None
+
+    def for_running_loop(self) -> "AgentDeps":
+        """These deps with the LLM using the running event loop's own HTTP client (see loop_local_llm)."""
+        llm = loop_local_llm(self.llm)
+        if llm is self.llm:
+            return self
+        if self._loop_deps is None or self._loop_deps.llm is not llm:
+            self._loop_deps = AgentDeps(llm, self.memory, self.task_queue, self.use_tools)
+        return self._loop_deps
+
+
+def _deps(config: RunnableConfig) -> AgentDeps:
+    return config["configurable"][_DEPS_KEY]
+
+
+def _adeps(config: RunnableConfig) -> AgentDeps:
+    """_deps() for async nodes, which await the LLM on the caller's event loop."""
+    return _deps(config).for_running_loop()
+
+
+@tool
+def search_memory_tool(query: str, config: RunnableConfig) -> str:
+    """Searches the agent's long-term memory for relevant information, facts, or past experiences."""
+    docs = _deps(config).memory.search(query)
+    if not docs:
+        return "No relevant information found in memory."
+    return "\n\n".join(docs)
+
+
+tool_node = ToolNode([search_memory_tool])
+
+
+def tool_executor_node(state: AgentState, config: RunnableConfig):
+    return tool_node.invoke(state, config)
+
+
+async def atool_executor_node(state: AgentState, config: RunnableConfig):
+    return await tool_node.ainvoke(state, config)
+
+
+def build_stm_context(stm: Dict[str, Any]) -> str:
+    style_key = stm.get('response_style', 'detailed')
+    style_instruction = prompts.RESPONSE_STYLE_INSTRUCTIONS.get(style_key, '')
+    return prompts.STM_CONTEXT_TEMPLATE.format(
+        current_time=stm.get('current_time', datetime.now().isoformat()),
+        turn_count=stm.get('turn_count', 0),
+        style_instruction=style_instruction
+    )
+
+
+def is_context_message(m: BaseMessage) -> bool:
+    """True for a retrieved-context injection (found in histories from older versions)."""
+    return isinstance(m, SystemMessage) and (
+        "--- Retrieved Context ---" in m.content or "--- 取得されたコンテキスト ---" in m.content
+    )
+
+
+def context_messages(docs: List[str]) -> List[BaseMessage]:
+    if not docs:
+        return []
+    context_str = "\n".join(docs)
+    return [SystemMessage(content=prompts.RETRIEVED_CONTEXT_TEMPLATE.format(context_str=context_str))]
+
+
+def curator_plan(state: AgentState, deps: AgentDeps) -> Dict[str, Any]:
+    """Everything before the Curator's LLM call.
+
+    Returns either {"result": <node output>} when no LLM call is needed, or
+    the context needed to make and apply the call.
     """
+    messages = state['messages']
+
+    # Retrieved context is kept in state["context_docs"] and added to the agent's
+    # prompt (agent_messages), so the history itself is never rewritten here.
+    last_user_msg = None
+    for i in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[i], HumanMessage):
+            last_user_msg = messages[i]
+            break
+    if not last_user_msg:
+        return {"result": {"context_docs": [], "extracted_entities": [], "problem_class": "", "draft_answered": False}}
+
+    user_input = last_user_msg.content.strip()
     
-    tools = []
-    if use_tools:
-        @tool
-        def search_memory_tool(query: str):
-            """Searches the agent's long-term memory for relevant information, facts, or past experiences."""
-            docs = memory.search(query)
-            if not docs:
-                return "No relevant information found in memory."
-            return "\n\n".join(docs)
-        tools = [search_memory_tool]
-
-    tool_node_instance = ToolNode(tools) if use_tools else None
-
-    def tool_executor_node(state: AgentState):
-        if not tool_node_instance:
-            return {}
-        result = tool_node_instance.invoke(state)
-        return {"messages": state['messages'] + result['messages']}
-
-    llm_with_tools = llm.bind_tools(tools) if use_tools else llm
-
-    # Configuration for fast-path optimization
-    curator_skip_simple = os.environ.get("ACE_CURATOR_SKIP_SIMPLE", "false").lower() == "true"
-    simple_patterns = [
-        r"^(はい|いいえ|うん|ううん|わかりました|了解|OK|ok|yes|no)\.?$",
-        r"^(ありがとう|thanks|thank you|どうも|サンキュー)",
-        r"^(こんにちは|こんばんは|おはよう|hello|hi|hey)\.?$",
-    ]
-    import re
-    skip_pattern_compiled = [re.compile(p, re.IGNORECASE) for p in simple_patterns]
-
-    def curator_node(state: AgentState):
-        messages = state['messages']
-
-        # Filter out previous context messages to avoid redundancy
-        messages = [
-            m for m in messages
-            if not (isinstance(m, SystemMessage) and
-                    ("--- Retrieved Context ---" in m.content or
-                     "--- 取得されたコンテキスト ---" in m.content))
-        ]
-
-        last_user_msg = next((m for m in reversed(messages) if isinstance(m, HumanMessage)), None)
-        if not last_user_msg:
-            return {"context_docs": [], "extracted_entities": [], "problem_class": ""}
-
-        user_input = last_user_msg.content.strip()
-        
-        # Fast-path: Skip LLM for simple/short queries
-        if curator_skip_simple:
-            is_simple = len(user_input) < 20 or any(p.match(user_input) for p in skip_pattern_compiled)
-            
-            if is_simple:
-                # Direct vector search without LLM intent analysis
-                docs = memory.search(user_input)
-                context_msg = []
-                if docs:
-                    context_str = "\n".join(docs)
-                    context_msg = [SystemMessage(content=prompts.RETRIEVED_CONTEXT_TEMPLATE.format(context_str=context_str))]
-                
-                return {
-                    "context_docs": docs,
-                    "extracted_entities": [],
-                    "problem_class": "",
-                    "messages": context_msg + messages if context_msg else messages
-                }
-
-        # Full path: LLM-based intent analysis (Curator + MFR)
-        history_txt = "\n".join([f"{type(m).__name__}: {m.content}" for m in messages[-5:-1]])
-        
-        # Get Current Model from State
-        current_stm = state.get('stm', {})
-        current_model = current_stm.get('model', {"constraints": [], "actions": [], "entities": []})
+    # Fast-path: Skip LLM for simple/short queries
+    if CURATOR_SKIP_SIMPLE:
+        is_simple = len(user_input) < 20 or _SIMPLE_RE.match(user_input) is not None
         
+        if is_simple:
+            # Direct vector search without LLM intent analysis
+            docs = deps.memory.search(user_input)
+
+            return {"result": {
+                "context_docs": docs,
+                "extracted_entities": [],
+                "problem_class": "",
+                "draft_answered": False
+            }}
+
+    # Full path: LLM-based intent analysis (Curator + MFR)
+    recent = []
+    for m in reversed(messages):
+        if not is_context_message(m):
+            recent.append(m)
+            if len(recent) == 5:
+                break
+    history_txt = "\n".join(f"{_ROLE_TAGS.get(type(m), 'Other')}: {m.content}" for m in reversed(recent[1:]))
+    
+    # Get Current Model from State
+    current_stm = state.get('stm', {})
+    current_model = current_stm.get('model', {"constraints": [], "actions": [], "entities": []})
+    
+    if deps.fused_llm is not None:
+        prompt = prompts.FUSED_CURATOR_PROMPT.format(
+            user_input=user_input,
+            current_model=dumps_compact(current_model),
+            history_txt=history_txt,
+            session_info=build_stm_context(current_stm) if current_stm else ""
+        )
+    else:
         prompt = prompts.INTENT_ANALYSIS_PROMPT.format(
             user_input=user_input,
-            current_model=json.dumps(current_model, ensure_ascii=False),
+            current_model=dumps_compact(current_model),
             history_txt=history_txt
         )
-        
+    return {
+        "user_input": user_input,
+        "llm_messages": [HumanMessage(content=prompt)],
+        "current_stm": current_stm,
+        "current_model": current_model,
+    }
+
+
+def curator_data(res: Any, deps: AgentDeps) -> Dict[str, Any]:
+    return res.model_dump() if deps.curator_llm is not deps.llm else parse_llm_json(res.content)
+
+
+def cached_curator_data(plan: Dict[str, Any], deps: AgentDeps) -> Optional[Dict[str, Any]]:
+    """Returns the stored intent analysis for an identical Curator prompt (retries, double submits).
+
+    Fused drafts are not replayed; their prompt carries the current time anyway.
+    """
+    if deps.task_queue is None or deps.fused_llm is not None:
+        return None
+    return deps.task_queue.get_cached_analysis(plan["llm_messages"][0].content)
+
+
+def cache_curator_data(plan: Dict[str, Any], data: Dict[str, Any], deps: AgentDeps):
+    """Stores the intent analysis on cache_write_pool, so the SQLite write stays off the turn's path."""
+    if deps.task_queue is not None and deps.fused_llm is None:
+        cache_write_pool.submit(_write_curator_cache, deps.task_queue, plan["llm_messages"][0].content, data)
+
+
+def _write_curator_cache(task_queue: TaskQueue, prompt: str, data: Dict[str, Any]):
+    try:
+        task_queue.cache_analysis(prompt, data)
+    except Exception as e:
+        print(f"[Curator] Error caching analysis: {e}", flush=True)
+
+
+def curator_result(plan: Dict[str, Any], data: Dict[str, Any], docs: List[str]) -> Dict[str, Any]:
+    """Applies the parsed Curator output and the retrieved docs to the state."""
+    current_stm = plan["current_stm"]
+    entities = data.get("entities", [])
+    p_class = data.get("problem_class", "")
+    stm_diffs = data.get("stm_diffs", [])
+    
+    # --- Apply MFR Diffs ---
+    new_model = plan["current_model"]
+    if stm_diffs:
+        print(f"[MFR] Applying Diffs: {stm_diffs}")
+        new_model = apply_diff(new_model, stm_diffs)
+
+    # Prepare updated STM state
+    new_stm = current_stm.copy()
+    new_stm['model'] = new_model
+
+    # Fused path: nothing retrieved, so the draft is the answer (skips the agent call).
+    draft = data.get("draft_answer")
+    if draft and not docs:
+        return {
+            "context_docs": [],
+            "extracted_entities": entities,
+            "problem_class": p_class,
+            "stm": new_stm,
+            "draft_answered": True,
+            "messages": [AIMessage(content=draft)]
+        }
+    
+    return {
+        "context_docs": docs,
+        "extracted_entities": entities,
+        "problem_class": p_class,
+        "stm": new_stm,  # Update STM in state
+        "draft_answered": False
+    }
+
+
+def curator_fallback(docs: List[str]) -> Dict[str, Any]:
+    """Result when the Curator's LLM call failed: raw-input retrieval only."""
+    return {
+        "context_docs": docs,
+        "extracted_entities": [],
+        "problem_class": "",
+        "draft_answered": False
+    }
+
+
+def curator_node(state: AgentState, config: RunnableConfig):
+    deps = _deps(config)
+    plan = curator_plan(state, deps)
+    if "result" in plan:
+        return plan["result"]
+
+    # Retrieval is independent of the LLM until the refined query is known; when the
+    # LLM keeps the raw input as its query (or fails), this result is used as-is.
+    speculative_docs = retrieval_pool.submit(deps.memory.search, plan["user_input"])
+
+    try:
+        data = cached_curator_data(plan, deps)
+        if data is None:
+            data = curator_data(call_llm_with_retry(deps.curator_llm, plan["llm_messages"]), deps)
+            cache_curator_data(plan, data, deps)
+        query = data.get("search_query", plan["user_input"])
+        if query.strip() == plan["user_input"]:
+            docs = speculative_docs.result()
+        else:
+            speculative_docs.cancel()  # Skips the search if it has not started yet
+            docs = deps.memory.search(query)
+        return curator_result(plan, data, docs)
+    except Exception as e:
+        print(f"[Curator] Error: {e}")
         try:
-            res = call_llm_with_retry(llm, [HumanMessage(content=prompt)]).content.strip()
-            if "```json" in res:
-                res = res.split("```json")[1].split("```")[0]
-            elif "```" in res:
-                res = res.split("```")[1].split("```")[0]
-            
-            data = json.loads(res)
-            entities = data.get("entities", [])
-            p_class = data.get("problem_class", "")
-            query = data.get("search_query", user_input)
-            stm_diffs = data.get("stm_diffs", [])
-            
-            # --- Apply MFR Diffs ---
-            new_model = current_model
-            if stm_diffs:
-                print(f"[MFR] Applying Diffs: {stm_diffs}")
-                new_model = apply_diff(current_model, stm_diffs)
-            
-            # Vector Search
-            docs = memory.search(query)
-            
-            context_msg = []
-            if docs:
-                context_str = "\n".join(docs)
-                context_msg = [SystemMessage(content=prompts.RETRIEVED_CONTEXT_TEMPLATE.format(context_str=context_str))]
-            
-            # Prepare updated STM state
-            new_stm = current_stm.copy()
-            new_stm['model'] = new_model
-            
-            return {
-                "context_docs": docs,
-                "extracted_entities": entities,
-                "problem_class": p_class,
-                "stm": new_stm,  # Update STM in state
-                "messages": context_msg + messages if context_msg else messages
-            }
-        except Exception as e:
-            print(f"[Curator] Error: {e}")
-            return {"context_docs": [], "extracted_entities": [], "problem_class": ""}
-
-
-    def agent_node(state: AgentState):
-        messages = list(state['messages'])
-        stm = state.get('stm', {})
-        
-        # Inject STM context as a system message at the beginning
-        if stm:
-            style_key = stm.get('response_style', 'detailed')
-            style_instruction = prompts.RESPONSE_STYLE_INSTRUCTIONS.get(style_key, '')
-            stm_context = prompts.STM_CONTEXT_TEMPLATE.format(
-                current_time=stm.get('current_time', datetime.now().isoformat()),
-                turn_count=stm.get('turn_count', 0),
-                style_instruction=style_instruction
-            )
-            messages = [SystemMessage(content=stm_context)] + messages
-        
+            docs = [] if speculative_docs.cancelled() else speculative_docs.result()
+        except Exception:
+            docs = []
+        return curator_fallback(docs)
+
+
+async def acurator_node(state: AgentState, config: RunnableConfig):
+    deps = _adeps(config)
+    plan = await asyncio.to_thread(curator_plan, state, deps)
+    if "result" in plan:
+        return plan["result"]
+
+    speculative_docs = asyncio.ensure_future(asyncio.to_thread(deps.memory.search, plan["user_input"]))
+
+    try:
+        data = await asyncio.to_thread(cached_curator_data, plan, deps)
+        if data is None:
+            data = curator_data(await acall_llm_with_retry(deps.curator_llm, plan["llm_messages"]), deps)
+            cache_curator_data(plan, data, deps)
+        query = data.get("search_query", plan["user_input"])
+        if query.strip() == plan["user_input"]:
+            docs = await speculative_docs
+        else:
+            # Not needed any more. Cancel it, or if it already finished, mark a failure
+            # as retrieved so asyncio does not log "Task exception was never retrieved".
+            if not speculative_docs.cancel():
+                speculative_docs.exception()
+            docs = await asyncio.to_thread(deps.memory.search, query)
+        return curator_result(plan, data, docs)
+    except Exception as e:
+        print(f"[Curator] Error: {e}")
         try:
-            response = call_llm_with_retry(llm_with_tools, messages)
-            return {"messages": state['messages'] + [response]}
-        except Exception as e:
-            return {"messages": state['messages'] + [AIMessage(content=f"Error in Agent: {e}")]}
-
-    def reflector_node(state: AgentState):
-        if task_queue is None:
-            return {"lesson_learned": "Reflector disabled: No task queue provided."}
-            
-        messages = state['messages']
-        human_msgs = [m for m in messages if isinstance(m, HumanMessage)]
-        ai_msgs = [m for m in messages if isinstance(m, AIMessage) and m.content]
+            docs = [] if speculative_docs.cancelled() else await speculative_docs
+        except Exception:
+            docs = []
+        return curator_fallback(docs)
+
+
+def agent_messages(state: AgentState) -> List[BaseMessage]:
+    """The agent's prompt: STM context, then this turn's retrieved context, then the history."""
+    stm = state.get('stm', {})
+    prefix = [SystemMessage(content=build_stm_context(stm))] if stm else []
+    return prefix + context_messages(state.get('context_docs')) + state['messages']
+
+
+def agent_node(state: AgentState, config: RunnableConfig):
+    try:
+        response = call_llm_with_retry(_deps(config).llm_with_tools, agent_messages(state))
+        return {"messages": [response]}
+    except Exception as e:
+        return {"messages": [AIMessage(content=f"Error in Agent: {e}")]}
+
+
+async def aagent_node(state: AgentState, config: RunnableConfig):
+    try:
+        response = await acall_llm_with_retry(_adeps(config).llm_with_tools, agent_messages(state))
+        return {"messages": [response]}
+    except Exception as e:
+        return {"messages": [AIMessage(content=f"Error in Agent: {e}")]}
+
+
+def reflector_node(state: AgentState, config: RunnableConfig):
+    task_queue = _deps(config).task_queue
+    if task_queue is None:
+        return {"lesson_learned": "Reflector disabled: No task queue provided."}
         
-        if not human_msgs or not ai_msgs:
-            return {}
+    messages = state['messages']
+    # Single reverse scan for the latest user message and non-empty AI reply.
+    last_human = None
+    last_ai = None
+    for i in range(len(messages) - 1, -1, -1):
+        m = messages[i]
+        if last_human is None and isinstance(m, HumanMessage):
+            last_human = m
+        elif last_ai is None and isinstance(m, AIMessage) and m.content:
+            last_ai = m
+        if last_human is not None and last_ai is not None:
+            break
 
-        last_human = human_msgs[-1]
-        last_ai = ai_msgs[-1]
+    if last_human is None or last_ai is None:
+        return {}
+    if REFLECT_SKIP_TRIVIAL and _SIMPLE_RE.match(last_human.content.strip()):
+        return {"lesson_learned": "Skipped: trivial interaction.", "should_store": False}
 
-        try:
-            print("[Reflector] Enqueueing interaction...", flush=True)
-            task_queue.enqueue_task(last_human.content, last_ai.content)
-            return {"lesson_learned": "Analysis queued in background.", "should_store": True}
-        except Exception as e:
-            print(f"[Reflector] Error enqueueing: {e}", flush=True)
-            return {"should_store": False, "lesson_learned": f"Error: {e}"}
-
-    # --- Graph ---
+    try:
+        print("[Reflector] Enqueueing interaction...", flush=True)
+        if not task_queue.enqueue_task(last_human.content, last_ai.content):
+            return {"lesson_learned": "Skipped: same interaction already queued.", "should_store": False}
+        return {"lesson_learned": "Analysis queued in background.", "should_store": True}
+    except Exception as e:
+        print(f"[Reflector] Error enqueueing: {e}", flush=True)
+        return {"should_store": False, "lesson_learned": f"Error: {e}"}
+
+
+async def areflector_node(state: AgentState, config: RunnableConfig):
+    # Only a SQLite insert; keep it off the event loop.
+    return await asyncio.to_thread(reflector_node, state, config)
+
+
+def route_after_curator(state: AgentState):
+    return "reflector" if state.get("draft_answered") else "agent"
+
+
+def check_tool_call(state: AgentState):
+    last_message = state['messages'][-1]
+    if hasattr(last_message, "tool_calls") and last_message.tool_calls:
+        return "tool_executor"
+    return "reflector"
+
+
+def _compile_graph(use_tools: bool) -> CompiledStateGraph:
     workflow = StateGraph(AgentState)
-    workflow.add_node("curator", curator_node)
-    workflow.add_node("agent", agent_node)
-    workflow.add_node("reflector", reflector_node)
+    # Each node has a sync and an async body, so the graph serves both invoke()
+    # and ainvoke()/astream() without blocking the event loop on LLM calls.
+    workflow.add_node("curator", RunnableLambda(curator_node, afunc=acurator_node, name="curator"))
+    workflow.add_node("agent", RunnableLambda(agent_node, afunc=aagent_node, name="agent"))
+    workflow.add_node("reflector", RunnableLambda(reflector_node, afunc=areflector_node, name="reflector"))
 
     if use_tools:
-        workflow.add_node("tool_executor", tool_executor_node)
+        workflow.add_node(
+            "tool_executor", RunnableLambda(tool_executor_node, afunc=atool_executor_node, name="tool_executor")
+        )
 
     workflow.set_entry_point("curator")
-    workflow.add_edge("curator", "agent")
+    # draft_answered is only ever set by the fused Curator (ACE_CURATOR_FUSED).
+    workflow.add_conditional_edges("curator", route_after_curator, {"agent": "agent", "reflector": "reflector"})
     
     if use_tools:
-        def check_tool_call(state: AgentState):
-            last_message = state['messages'][-1]
-            if hasattr(last_message, "tool_calls") and last_message.tool_calls:
-                return "tool_executor"
-            return "reflector"
-
         workflow.add_conditional_edges("agent", check_tool_call, {"tool_executor": "tool_executor", "reflector": "reflector"})
         workflow.add_edge("tool_executor", "agent")
     else:
@@ -230,3 +456,29 @@ def build_ace_agent(llm: ChatOpenAI, memory: ACE_Memory, task_queue: Optional[Ta
 
     workflow.add_edge("reflector", END)
     return workflow.compile()
+
+
+_graphs: Dict[bool, CompiledStateGraph] = {}
+_graphs_lock = threading.Lock()
+
+
+def get_compiled_graph(use_tools: bool = True) -> CompiledStateGraph:
+    """Returns the process-wide compiled graph for `use_tools` (compiled on first use)."""
+    graph = _graphs.get(use_tools)
+    if graph is None:
+        with _graphs_lock:
+            graph = _graphs.get(use_tools)
+            if graph is None:
+                graph = _graphs[use_tools] = _compile_graph(use_tools)
+    return graph
+
+
+def build_ace_agent(llm: ChatOpenAI, memory: ACE_Memory, task_queue: Optional[TaskQueue] = None, use_tools: bool = True):
+    """
+    Builds the ACE Agent graph.
+    If task_queue is not provided, reflector will not enqueue tasks.
+    The compiled graph is shared; the returned copy reuses its nodes and
+    binds this agent's LLM, memory and queue through the run config.
+    """
+    deps = AgentDeps(llm, memory, task_queue, use_tools)
+    return get_compiled_graph(use_tools).with_config(configurable={_DEPS_KEY: deps})
@@ -0,0 +1,37 @@
+"""
+Structured-output schemas for LLM calls in the agent graph.
+"""
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class CuratorIntent(BaseModel):
+    """Intent analysis produced by the Curator (INTENT_ANALYSIS_PROMPT)."""
+
+    entities: List[str] = Field(default_factory=list, description="Specific entities and facts in the request")
+    problem_class: str = Field(default="", description="Abstract problem class of the request")
+    search_query: str = Field(description="Single search query combining entities and abstract concepts")
+    stm_diffs: List[str] = Field(default_factory=list, description="MFR diff operations for the current model")
+
+
+class ReflectionResult(BaseModel):
+    """Unified analysis & synthesis decision produced by the BackgroundWorker (UNIFIED_ANALYSIS_PROMPT)."""
+
+    should_store: bool = Field(description="Whether the interaction is valuable as knowledge")
+    action: str = Field(default="NEW", description="NEW, UPDATE or KEPT (only meaningful if should_store)")
+    target_doc_id: Optional[int] = Field(default=None, description="Id of the document to update for UPDATE")
+    analysis: str = Field(default="", description="Content for NEW or UPDATE")
+    entities: List[str] = Field(default_factory=list, description="Entities covered by the knowledge")
+    problem_class: str = Field(default="", description="Abstract problem class of the knowledge")
+    rationale: str = Field(default="", description="Reason for the decision")
+
+
+class CuratorDraft(BaseModel):
+    """Intent analysis and a draft answer produced by the fused Curator call."""
+
+    entities: List[str] = Field(default_factory=list, description="Specific entities and facts in the request")
+    problem_class: str = Field(default="", description="Abstract problem class of the request")
+    search_query: str = Field(description="Single search query combining entities and abstract concepts")
+    stm_diffs: List[str] = Field(default_factory=list, description="MFR diff operations for the current model")
+    draft_answer: str = Field(description="Complete answer to the user's request")
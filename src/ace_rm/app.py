@@ -1,96 +1,181 @@
+import asyncio
+import hashlib
 import gradio as gr
 import pandas as pd
+import threading
 import uuid
-import os
+import weakref
 from datetime import datetime
-from typing import Dict, Any
+from typing import TYPE_CHECKING, Dict, Any, Optional
 
 from langchain_core.messages import HumanMessage, AIMessage
-from ace_rm.ace_framework import (
-    build_ace_agent, ACE_Memory, TaskQueue, BackgroundWorker
-)
 from ace_rm.config import (
-    MODEL_NAME, BASE_URL, OPENAI_API_KEY, LLM_TEMPERATURE, LTM_MODE
+    LTM_MODE, DISTANCE_METRIC, DISTANCE_THRESHOLD, SESSION_MAX_AGENTS, SESSION_TTL,
+    RESPONSE_CACHE, RESPONSE_CACHE_THRESHOLD, RESPONSE_CACHE_SIZE, RESPONSE_CACHE_QUANT,
+    UI_CONCURRENCY, UI_QUEUE_SIZE
 )
-from langchain_openai import ChatOpenAI
+from ace_rm.utils.response_cache import SemanticResponseCache
+from ace_rm.utils.session_cache import SessionCache
+
+if TYPE_CHECKING:
+    from ace_rm.ace_framework import ACE_Memory, TaskQueue
+
+# The agent stack (torch, FAISS, LangGraph, the OpenAI client) is imported when the
+# first agent is created, so the UI can start while it loads.
 
 print(f"Running in LTM_MODE: {LTM_MODE}", flush=True)
 
 # --- Global/Session-based Initialization ---
-agent_sessions: Dict[str, Any] = {}
 shared_agent = None
+# Guards lazy agent creation; Gradio handles concurrent requests on worker threads.
+_agents_lock = threading.Lock()
+# Isolated mode: one thread drains every session's queue (started with the first session).
+shared_worker = None
+_worker_lock = threading.Lock()
 
-if LTM_MODE == "shared":
-    print("Initializing shared agent...", flush=True)
-    llm = ChatOpenAI(
-        model=MODEL_NAME,
-        api_key=OPENAI_API_KEY,
-        base_url=BASE_URL,
-        temperature=LLM_TEMPERATURE
-    )
-    # No session_id provided for a shared memory
-    shared_memory = ACE_Memory()
-    shared_queue = TaskQueue()
-    shared_ace_app = build_ace_agent(llm, shared_memory, shared_queue)
-
-    # shared worker now gets explicit memory/queue instances
-    shared_worker = BackgroundWorker(llm=llm, memory=shared_memory, task_queue=shared_queue)
-    shared_worker.start()
-
-    shared_agent = {
-        "memory": shared_memory,
-        "queue": shared_queue,
-        "app": shared_ace_app,
-        "worker": shared_worker,
-        "stm_model": {"constraints": [], "actions": [], "entities": []}  # Initialize empty World Model
+
+def _get_shared_worker():
+    global shared_worker
+    with _worker_lock:
+        if shared_worker is None:
+            from ace_rm.ace_framework import SharedBackgroundWorker
+            shared_worker = SharedBackgroundWorker()
+            shared_worker.start()
+        return shared_worker
+
+
+# session_state key under which an evicted session's STM world model is kept.
+STM_MODEL_KEY = "stm_model"
+
+
+def _release_agent(session_id: str, agent_data: Dict[str, Any]):
+    """Detaches an evicted session from the worker and persists its buffered vectors.
+
+    The shared worker still finishes the session's queued tasks and flushes what
+    they add, so nothing claimed or pending is left behind. The STM world model
+    is saved for the session's next agent; the response cache is dropped.
+    """
+    print(f"Evicting idle agent for session: {session_id}", flush=True)
+    if shared_worker is not None:
+        shared_worker.detach(session_id)
+    agent_data["memory"].save_state(STM_MODEL_KEY, agent_data["stm_model"])
+    agent_data["memory"].flush()
+
+
+# Isolated-mode agents, evicted when idle or over capacity (their data stays on disk).
+agent_sessions: SessionCache[Dict[str, Any]] = SessionCache(
+    maxsize=SESSION_MAX_AGENTS, ttl=SESSION_TTL, on_evict=_release_agent
+)
+
+
+def _create_agent(session_id: Optional[str] = None) -> Dict[str, Any]:
+    """Builds memory, queue, graph and worker for one agent.
+
+    The shared agent runs its own worker thread; isolated sessions are
+    attached to the shared worker instead.
+    """
+    from ace_rm.ace_framework import build_ace_agent, ACE_Memory, TaskQueue, BackgroundWorker
+    from ace_rm.utils.llm_manager import get_llm
+
+    llm = get_llm()
+    memory_instance = ACE_Memory(session_id=session_id)
+    queue_instance = TaskQueue(session_id=session_id)
+    ace_app_instance = build_ace_agent(llm, memory_instance, queue_instance)
+    worker_instance = BackgroundWorker(llm=llm, memory=memory_instance, task_queue=queue_instance)
+    if session_id is None:
+        worker_instance.start()
+    else:
+        _get_shared_worker().attach(session_id, worker_instance)
+
+    return {
+        "memory": memory_instance,
+        "queue": queue_instance,
+        "app": ace_app_instance,
+        "worker": worker_instance,
+        "response_cache": SemanticResponseCache(
+            RESPONSE_CACHE_THRESHOLD, RESPONSE_CACHE_SIZE, quantize=RESPONSE_CACHE_QUANT == "int8"
+        ) if RESPONSE_CACHE else None,
+        # World Model: empty, or as saved when this session's previous agent was evicted
+        "stm_model": memory_instance.load_state(STM_MODEL_KEY, {"constraints": [], "actions": [], "entities": []})
     }
 
+
 def get_session_agent(session_id: str):
     """
     Creates or retrieves an ACE agent instance based on the LTM_MODE.
+    Agents are created on first use, so importing this module starts no
+    worker threads or LLM clients.
     """
+    global shared_agent
     if LTM_MODE == "shared":
+        if shared_agent is None:
+            with _agents_lock:
+                if shared_agent is None:
+                    print("Initializing shared agent...", flush=True)
+                    # No session_id provided for a shared memory
+                    shared_agent = _create_agent()
         return shared_agent
 
     # Isolated mode
-    if session_id not in agent_sessions:
+    def create():
         print(f"Creating new agent for session: {session_id}", flush=True)
-        llm = ChatOpenAI(
-            model=MODEL_NAME,
-            api_key=OPENAI_API_KEY,
-            base_url=BASE_URL,
-            temperature=LLM_TEMPERATURE
-        )
-        memory_instance = ACE_Memory(session_id=session_id)
-        queue_instance = TaskQueue(session_id=session_id)
-        ace_app_instance = build_ace_agent(llm, memory_instance, queue_instance)
-        worker_instance = BackgroundWorker(llm=llm, memory=memory_instance, task_queue=queue_instance)
-        worker_instance.start()
+        return _create_agent(session_id)
+
+    return agent_sessions.get_or_create(session_id, create)
 
-        agent_sessions[session_id] = {
-            "memory": memory_instance,
-            "queue": queue_instance,
-            "app": ace_app_instance,
-            "worker": worker_instance,
-            "stm_model": {"constraints": [], "actions": [], "entities": []}  # Initialize empty World Model
-        }
-    return agent_sessions[session_id]
 
+RESPONSE_STYLE_CHOICES = [
+    ("簡潔", "concise"),
+    ("詳細", "detailed"),
+    ("根拠重視", "evidence-based"),
+    ("ステップバイステップ", "step-by-step"),
+    ("比較・対照", "comparative"),
+    ("チュートリアル", "tutorial"),
+    ("要約のみ", "summary-only"),
+]
 
-def process_chat(user_message: str, history: list, session_id: str, response_style: str):
+# Background-processing status fragments, joined with " | ".
+STATUS_PENDING = "⏳ {} task(s) processing"
+STATUS_IDLE = "✓ Queue idle"
+STATUS_DONE = "📊 {} recently completed"
+STATUS_FAILED = "⚠️ {} failed"
+LTM_STATUS = "📚 Total: {} documents"
+
+# Per-turn graph input fields that never vary. Empty tuples rather than lists, so the
+# shared values cannot be mutated in place (the Curator replaces them each turn).
+INITIAL_STATE_TEMPLATE = {"retry_count": 0, "context_docs": (), "extracted_entities": (), "problem_class": ""}
+
+
+# Strong references to fire-and-forget warm-up tasks (the event loop only keeps weak ones).
+_warmup_tasks = set()
+
+
+async def warm_up_agent(session_agent: Dict[str, Any]):
     """
-    Executes the ACE Agent for the given session.
+    Pays one-time costs before the user's first turn: the encoder's first
+    forward pass and FAISS index load, and the LLM endpoint's TCP/TLS
+    handshake (a token-free GET /models on the shared async client).
     """
-    session_agent = get_session_agent(session_id)
-    ace_app = session_agent["app"]
+    from ace_rm.utils.llm_manager import get_llm
+
+    results = await asyncio.gather(
+        asyncio.to_thread(session_agent["memory"].search, "warmup"),
+        get_llm().root_async_client.models.list(),
+        return_exceptions=True,
+    )
+    for res in results:
+        if isinstance(res, Exception):
+            print(f"[Warmup] Skipped: {res}", flush=True)
 
-    if not user_message:
-        # On empty input, just refresh the memory and task views
-        memory_df = get_memory_df(session_agent["memory"])
-        task_df = get_task_df(session_agent["queue"])
-        # Return 8 values: history, entities, context, stm_model, ltm_status, reflector_status, memory_df, task_df
-        return history, "", "", {}, "Refreshing...", "Refreshing...", memory_df, task_df
 
+def response_cache_key(messages: list, response_style: str) -> str:
+    """Response style plus a hash of the four messages before the current one (the Curator's history window)."""
+    recent = "\n".join(f"{m.type}: {m.content}" for m in messages[-4:])
+    return f"{response_style}|{hashlib.sha256(recent.encode()).hexdigest()}"
+
+
+def history_to_messages(history: list) -> list:
+    """Converts Gradio chat history into LangChain messages."""
     # Gradio 6.x history is often a list of dictionaries [{'role': 'user', 'content': '...'}, ...]
     # or the previous list of tuples format. We handle both to be safe.
     messages = []
@@ -105,97 +190,200 @@ def process_chat(user_message: str, history: list, session_id: str, response_sty
         elif isinstance(m, (list, tuple)) and len(m) == 2:
             messages.append(HumanMessage(content=m[0]))
             messages.append(AIMessage(content=m[1]))
+    return messages
 
-    messages.append(HumanMessage(content=user_message))
 
-    # Build STM (Short-Term Memory) object
-    # Retrieve persisted World Model
-    persisted_model = session_agent.get("stm_model", {"constraints": [], "actions": [], "entities": []})
-    
-    stm = {
-        "current_time": datetime.now().isoformat(),
-        "response_style": response_style,
-        "turn_count": len([m for m in history if isinstance(m, dict) and m.get('role') == 'user']) + 1,
-        "model": persisted_model  # Inject persisted model
-    }
+async def process_chat(user_message: str, history: list, session_id: str, response_style: str,
+                       converted: Optional[tuple] = None):
+    """
+    Executes the ACE Agent for the given session.
+    Runs the graph on Gradio's event loop and streams the agent's reply into
+    the chatbot as tokens arrive; the debug panels are filled in once the
+    graph has finished.
 
-    initial_state = {
-        "messages": messages, "retry_count": 0, "context_docs": [],
-        "extracted_entities": [], "problem_class": "", "stm": stm
-    }
-    
-    final_state = ace_app.invoke(initial_state)
-    
-    last_msg = final_state["messages"][-1]
-    response_text = last_msg.content if isinstance(last_msg, AIMessage) else str(last_msg)
-    
-    entities_str = f"Entities: {final_state.get('extracted_entities', [])}\nClass: {final_state.get('problem_class', '')}"
-    context_list = final_state.get("context_docs", [])
-    context_str = "\n---\n".join(context_list) if context_list else "No context retrieved."
-    
-    new_memory_df = get_memory_df(session_agent["memory"])
-    new_task_df = get_task_df(session_agent["queue"])
+    `converted` is the (history length, messages) pair returned by the previous
+    turn, so the history is not rebuilt as LangChain messages every turn.
+    """
+    # Agent creation and the SQLite reads below block, so they run off the event loop.
+    session_agent = await asyncio.to_thread(get_session_agent, session_id)
+    ace_app = session_agent["app"]
 
+    if not user_message:
+        # On empty input, just refresh the memory and task views
+        memory_df = await asyncio.to_thread(get_memory_df, session_agent["memory"])
+        task_df = await asyncio.to_thread(get_task_df, session_agent["queue"])
+        # Yield 12 values: history, entities, context, stm_model, ltm_status, reflector_status, memory_df, task_df,
+        # converted history, then the input box, idle tick count and timer (see _after_turn)
+        yield (history, "", "", {}, "Refreshing...", "Refreshing...", memory_df, task_df, converted) + _after_turn()
+        return
+
+    if converted is not None and converted[0] == len(history):
+        prior_messages = converted[1]
+    else:
+        # First turn, or the chatbot was edited outside process_chat: convert once.
+        prior_messages = history_to_messages(history)
+    messages = prior_messages + [HumanMessage(content=user_message)]
+
+    # Tables are only re-sent if this turn (or the worker meanwhile) wrote to them;
+    # otherwise the client already shows them and the timer keeps them current.
+    versions_before = (session_agent["memory"].data_version, session_agent["queue"].data_version)
+
+    user_turn = {"role": "user", "content": user_message}
+    response_cache = session_agent["response_cache"]
+    cached = None
+    if response_cache is not None:
+        cache_key = response_cache_key(messages[:-1], response_style)
+        query_vec = await asyncio.to_thread(session_agent["memory"].embed_query, user_message.strip())
+        cached = response_cache.lookup(cache_key, query_vec)
+
+    if cached is not None:
+        # Near-duplicate of an earlier message in the same context: no graph run, no LLM calls.
+        response_text, entities_str, context_str = cached["response"], cached["entities"], cached["context"]
+        stm_model = session_agent["stm_model"]
+    else:
+        # Build STM (Short-Term Memory) object
+        # Retrieve persisted World Model
+        persisted_model = session_agent.get("stm_model", {"constraints": [], "actions": [], "entities": []})
+        
+        stm = {
+            "current_time": datetime.now().isoformat(),
+            "response_style": response_style,
+            # process_chat appends user/assistant pairs, so no scan is needed to count user turns.
+            "turn_count": len(history) // 2 + 1,
+            "model": persisted_model  # Inject persisted model
+        }
+
+        initial_state = {**INITIAL_STATE_TEMPLATE, "messages": messages, "stm": stm}
+        
+        final_state = None
+        streamed = ""
+        async for event in ace_app.astream_events(initial_state, version="v2"):
+            kind = event["event"]
+            if kind == "on_chain_end" and not event["parent_ids"]:
+                final_state = event["data"]["output"]
+            elif event["metadata"].get("langgraph_node") != "agent":
+                continue  # Curator output is JSON for the graph, not for the user
+            elif kind == "on_chat_model_start":
+                streamed = ""  # A new agent turn after a tool call replaces the partial reply
+            elif kind == "on_chat_model_stream":
+                token = event["data"]["chunk"].content
+                if token and isinstance(token, str):
+                    streamed += token
+                    partial_history = history + [user_turn, {"role": "assistant", "content": streamed}]
+                    yield (partial_history,) + (gr.skip(),) * 11
+
+        last_msg = final_state["messages"][-1]
+        response_text = last_msg.content if isinstance(last_msg, AIMessage) else str(last_msg)
+        
+        entities_str = f"Entities: {final_state.get('extracted_entities', [])}\nClass: {final_state.get('problem_class', '')}"
+        context_list = final_state.get("context_docs", [])
+        context_str = "\n---\n".join(context_list) if context_list else "No context retrieved."
+
+        # Get STM Model
+        stm_state = final_state.get('stm', {})
+        stm_model = stm_state.get('model', {})
+        
+        # Persist updated model back to session
+        if stm_model:
+            session_agent["stm_model"] = stm_model
+
+        if response_cache is not None and isinstance(last_msg, AIMessage) and response_text \
+                and not response_text.startswith("Error in Agent"):
+            response_cache.store(cache_key, query_vec, {
+                "response": response_text, "entities": entities_str, "context": context_str
+            })
+    
     # Build new history in Gradio 6.x format
     new_history = history + [
-        {"role": "user", "content": user_message},
+        user_turn,
         {"role": "assistant", "content": response_text}
     ]
 
+    ltm_status, reflector_status, memory_out, task_out = await asyncio.to_thread(
+        _turn_panels, session_agent, versions_before
+    )
+
+    new_converted = (len(new_history), messages + [AIMessage(content=response_text)])
+    yield (
+        new_history, entities_str, context_str, stm_model,
+        ltm_status, reflector_status, memory_out, task_out, new_converted
+    ) + _after_turn()
+
+
+def _turn_panels(session_agent: Dict[str, Any], versions_before: tuple) -> tuple:
+    """Returns (ltm_status, reflector_status, memory_df, task_df) after a turn.
+
+    A table is only rebuilt if its data_version moved since `versions_before`;
+    otherwise gr.skip() leaves the client's copy in place.
+    """
     # Get meaningful status about background processing and LTM updates
-    all_tasks = session_agent["queue"].get_tasks()
-    pending_count = len([t for t in all_tasks if t['status'] in ['pending', 'processing']])
-    recent_done = [t for t in all_tasks if t['status'] == 'done'][:3]  # Last 3 completed
-    recent_failed = [t for t in all_tasks if t['status'] == 'failed'][:1]  # Last failure
-    
+    status_counts = session_agent["queue"].get_status_summary()
+    pending_count = status_counts.get('pending', 0) + status_counts.get('processing', 0)
+    recent_done = min(status_counts.get('done', 0), 3)  # Up to the last 3 completed
+    recent_failed = min(status_counts.get('failed', 0), 1)  # Last failure
+
     # Build status message
-    status_parts = []
-    if pending_count > 0:
-        status_parts.append(f"⏳ {pending_count} task(s) processing")
-    else:
-        status_parts.append("✓ Queue idle")
-    
+    status_parts = [STATUS_PENDING.format(pending_count) if pending_count > 0 else STATUS_IDLE]
     if recent_done:
-        status_parts.append(f"📊 {len(recent_done)} recently completed")
-    
+        status_parts.append(STATUS_DONE.format(recent_done))
     if recent_failed:
-        status_parts.append(f"⚠️ {len(recent_failed)} failed")
-    
+        status_parts.append(STATUS_FAILED.format(recent_failed))
     reflector_status = " | ".join(status_parts)
-    
-    # Get LTM update count (compare documents before and after)
-    current_doc_count = len(new_memory_df)
-    ltm_status = f"📚 Total: {current_doc_count} documents"
 
-    # Get STM Model
-    stm_state = final_state.get('stm', {})
-    stm_model = stm_state.get('model', {})
-    
-    # Persist updated model back to session
-    if stm_model:
-        session_agent["stm_model"] = stm_model
-    
-    return (
-        new_history, entities_str, context_str, stm_model,
-        ltm_status, reflector_status, new_memory_df, new_task_df
+    # The table is capped at MEMORY_TABLE_ROWS, so count documents in SQLite.
+    ltm_status = LTM_STATUS.format(session_agent["memory"].count())
+
+    memory, queue = session_agent["memory"], session_agent["queue"]
+    memory_out = get_memory_df(memory) if memory.data_version != versions_before[0] else gr.skip()
+    task_out = get_task_df(queue) if queue.data_version != versions_before[1] else gr.skip()
+    return ltm_status, reflector_status, memory_out, task_out
+
+MEMORY_COLUMNS = ["id", "content", "entities", "problem_class", "timestamp"]
+TASK_COLUMNS = ["id", "user_input", "status", "created_at", "updated_at", "error_msg"]
+# The memory table shows the newest documents only; the full set stays searchable by the agent.
+MEMORY_TABLE_ROWS = 500
+
+# Last rendered table per memory/queue instance, tagged with its data_version.
+# Timer ticks and chat turns reuse it until that instance writes again.
+_frames: "weakref.WeakKeyDictionary[Any, tuple]" = weakref.WeakKeyDictionary()
+
+
+def _cached_frame(source, fetch, columns) -> pd.DataFrame:
+    version = source.data_version  # Read first: a concurrent write just forces the next rebuild
+    cached = _frames.get(source)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    df = pd.DataFrame(fetch(), columns=columns)
+    _frames[source] = (version, df)
+    return df
+
+def get_memory_df(memory_instance: "ACE_Memory"):
+    return _cached_frame(
+        memory_instance, lambda: memory_instance.get_all_columnar(MEMORY_TABLE_ROWS), MEMORY_COLUMNS
     )
 
-def get_memory_df(memory_instance: ACE_Memory):
-    data = memory_instance.get_all()
-    if not data:
-        return pd.DataFrame(columns=["id", "content", "entities", "problem_class", "timestamp"])
-    return pd.DataFrame(data)
+def get_task_df(queue_instance: "TaskQueue"):
+    return _cached_frame(queue_instance, queue_instance.get_tasks_columnar, TASK_COLUMNS)
+
+# Auto-refresh interval (seconds) for idle tables: 5 s while data changes,
+# 10 s after 6 unchanged ticks (~30 s), 30 s after 12 (~1.5 min).
+REFRESH_BACKOFF = ((12, 30.0), (6, 10.0), (0, 5.0))
 
-def get_task_df(queue_instance: TaskQueue):
-    data = queue_instance.get_tasks()
-    if not data:
-        return pd.DataFrame(columns=["id", "user_input", "status", "created_at", "updated_at", "error_msg"])
-    return pd.DataFrame(data)
+
+def refresh_interval(idle_ticks: int) -> float:
+    return next(interval for ticks, interval in REFRESH_BACKOFF if idle_ticks >= ticks)
+
+
+def _after_turn() -> tuple:
+    """Clears the input box and restarts the table refresh at its fastest interval."""
+    return "", 0, gr.Timer(value=refresh_interval(0))
 
 def reset_memory_handler(session_id: str):
     session_agent = get_session_agent(session_id)
     session_agent["memory"].clear()
     session_agent["queue"].clear()
+    if session_agent["response_cache"] is not None:
+        session_agent["response_cache"].clear()
     return get_memory_df(session_agent["memory"])
 
 def apply_distance_threshold(session_id: str, threshold: float):
@@ -209,6 +397,8 @@ with gr.Blocks(title="ACE Agent Framework") as demo:
     # Use a fixed session ID for shared mode, or generate a new one for isolated mode
     session_id_val = "shared_session" if LTM_MODE == "shared" else str(uuid.uuid4())
     session_id = gr.State(value=session_id_val)
+    # (history length, LangChain messages) of the chatbot as of the last turn.
+    converted_history = gr.State(value=None)
 
     gr.Markdown("# 🤖 ACE (Agentic Context Engineering) Framework Demo")
     
@@ -219,7 +409,7 @@ with gr.Blocks(title="ACE Agent Framework") as demo:
                 msg = gr.Textbox(scale=4, placeholder="Type a message...", show_label=False)
                 submit_btn = gr.Button("Send", scale=1, variant="primary")
             clear_btn = gr.Button("Clear Chat")
-            clear_btn.click(lambda: ([], ""), None, [chatbot, msg])
+            clear_btn.click(lambda: ([], "", None), None, [chatbot, msg, converted_history])
 
         with gr.Column(scale=1):
             gr.Markdown("### 🛠️ Internals (Debug)")
@@ -232,10 +422,10 @@ with gr.Blocks(title="ACE Agent Framework") as demo:
             with gr.Group():
                 gr.Markdown("#### Search Settings")
                 # Determine slider range based on distance metric
-                distance_metric = os.environ.get('ACE_DISTANCE_METRIC', 'l2').lower()
+                distance_metric = DISTANCE_METRIC
                 is_cosine = (distance_metric == 'cosine')
                 
-                initial_threshold = float(os.environ.get('ACE_DISTANCE_THRESHOLD', '0.7' if is_cosine else '1.8'))
+                initial_threshold = DISTANCE_THRESHOLD
                 slider_min = 0.0 if is_cosine else 1.0
                 slider_max = 1.0 if is_cosine else 3.0
                 slider_step = 0.05 if is_cosine else 0.1
@@ -249,15 +439,7 @@ with gr.Blocks(title="ACE Agent Framework") as demo:
             with gr.Group():
                 gr.Markdown("#### 🎛️ 応答設定 (STM)")
                 response_style = gr.Dropdown(
-                    choices=[
-                        ("簡潔", "concise"),
-                        ("詳細", "detailed"),
-                        ("根拠重視", "evidence-based"),
-                        ("ステップバイステップ", "step-by-step"),
-                        ("比較・対照", "comparative"),
-                        ("チュートリアル", "tutorial"),
-                        ("要約のみ", "summary-only"),
-                    ],
+                    choices=RESPONSE_STYLE_CHOICES,
                     value="detailed",
                     label="応答スタイル"
                 )
@@ -267,7 +449,7 @@ with gr.Blocks(title="ACE Agent Framework") as demo:
             ltm_title = "### 🧠 Long-Term Memory (Shared)" if LTM_MODE == 'shared' else "### 🧠 Long-Term Memory (Session-Specific)"
             gr.Markdown(ltm_title)
             memory_table = gr.DataFrame(
-                headers=["id", "content", "entities", "problem_class", "timestamp"],
+                headers=MEMORY_COLUMNS,
                 interactive=False, wrap=True
             )
             refresh_mem_btn = gr.Button("Refresh Memory")
@@ -276,62 +458,106 @@ with gr.Blocks(title="ACE Agent Framework") as demo:
         with gr.Column():
             gr.Markdown("### ⏳ Background Reflection Queue")
             task_table = gr.DataFrame(
-                headers=["id", "user_input", "status", "created_at", "updated_at", "error_msg"],
+                headers=TASK_COLUMNS,
                 interactive=False, wrap=True
             )
-            gr.Markdown("*Queue auto-refreshes every 5 seconds*")
+            gr.Markdown("*Queue auto-refreshes every 5 seconds (backing off to 30 s while idle)*")
 
     # Timer for auto-refresh
-    timer = gr.Timer(5)
+    timer = gr.Timer(refresh_interval(0))
+    # Per-client change tracking for the auto-refresh: versions last sent and unchanged-tick count.
+    last_versions = gr.State(value=None)
+    idle_ticks = gr.State(value=0)
 
-    def on_load(session_id_str: str):
+    async def on_load(session_id_str: str):
         print(f"UI loaded for session: {session_id_str}", flush=True)
-        session_agent = get_session_agent(session_id_str)
-        return get_memory_df(session_agent["memory"]), get_task_df(session_agent["queue"])
+        session_agent = await asyncio.to_thread(get_session_agent, session_id_str)
+        task = asyncio.create_task(warm_up_agent(session_agent))
+        _warmup_tasks.add(task)
+        task.add_done_callback(_warmup_tasks.discard)
+        # Cold SQLite reads and DataFrame builds: keep them off the event loop.
+        memory_df = await asyncio.to_thread(get_memory_df, session_agent["memory"])
+        task_df = await asyncio.to_thread(get_task_df, session_agent["queue"])
+        return memory_df, task_df
 
     def refresh_ui_state(session_id_str: str):
         session_agent = get_session_agent(session_id_str)
         return get_memory_df(session_agent["memory"]), get_task_df(session_agent["queue"])
 
-    submit_btn.click(
-        process_chat,
-        inputs=[msg, chatbot, session_id, response_style],
-        outputs=[chatbot, curator_intent, curator_context, stm_view, ltm_status, reflector_status, memory_table, task_table]
-    ).then(lambda: "", None, msg) # Clear msg AFTER update
-
-    msg.submit(
-        process_chat,
-        inputs=[msg, chatbot, session_id, response_style],
-        outputs=[chatbot, curator_intent, curator_context, stm_view, ltm_status, reflector_status, memory_table, task_table]
-    ).then(lambda: "", None, msg) # Clear msg AFTER update
+    def tick_ui_state(session_id_str: str, last_seen, idle: int):
+        """Timer refresh: sends each table only if its memory or queue wrote since the last tick."""
+        session_agent = get_session_agent(session_id_str)
+        memory_instance, queue_instance = session_agent["memory"], session_agent["queue"]
+        # The instance ids make a recreated (evicted and reloaded) agent count as a change.
+        versions = (
+            (id(memory_instance), memory_instance.data_version),
+            (id(queue_instance), queue_instance.data_version),
+        )
+        last_memory, last_queue = last_seen or (None, None)
+        if versions == (last_memory, last_queue):
+            idle += 1
+            interval = refresh_interval(idle)
+            timer_update = gr.Timer(value=interval) if interval != refresh_interval(idle - 1) else gr.skip()
+            return gr.skip(), gr.skip(), last_seen, idle, timer_update
+        timer_update = gr.Timer(value=refresh_interval(0)) if idle else gr.skip()
+        memory_out = get_memory_df(memory_instance) if versions[0] != last_memory else gr.skip()
+        task_out = get_task_df(queue_instance) if versions[1] != last_queue else gr.skip()
+        return memory_out, task_out, versions, 0, timer_update
+
+    # The final yield of process_chat also clears msg and resets the refresh backoff,
+    # so no follow-up event (and round trip) is needed.
+    chat_inputs = [msg, chatbot, session_id, response_style, converted_history]
+    chat_outputs = [
+        chatbot, curator_intent, curator_context, stm_view, ltm_status, reflector_status,
+        memory_table, task_table, converted_history, msg, idle_ticks, timer
+    ]
+    submit_btn.click(process_chat, inputs=chat_inputs, outputs=chat_outputs)
+    msg.submit(process_chat, inputs=chat_inputs, outputs=chat_outputs)
 
     refresh_mem_btn.click(refresh_ui_state, inputs=[session_id], outputs=[memory_table, task_table])
     reset_mem_btn.click(reset_memory_handler, inputs=[session_id], outputs=[memory_table])
     
     # Distance threshold control
     threshold_status = gr.Textbox(visible=False)  # Hidden status indicator
+    # A drag fires change on every step; "always_last" drops the intermediate values
+    # while an update is in flight and applies only the latest one afterwards.
     distance_slider.change(
         apply_distance_threshold,
         inputs=[session_id, distance_slider],
-        outputs=[threshold_status]
+        outputs=[threshold_status],
+        trigger_mode="always_last",
+        show_progress="hidden"
     )
     
     # Auto-refresh wiring
-    timer.tick(refresh_ui_state, inputs=[session_id], outputs=[memory_table, task_table])
+    timer.tick(
+        tick_ui_state,
+        inputs=[session_id, last_versions, idle_ticks],
+        outputs=[memory_table, task_table, last_versions, idle_ticks, timer]
+    )
     
     demo.load(on_load, inputs=[session_id], outputs=[memory_table, task_table])
 
+# Gradio runs one event per listener at a time by default, which would serialize
+# every user's chat turn behind the current one's LLM calls.
+demo.queue(default_concurrency_limit=UI_CONCURRENCY, max_size=UI_QUEUE_SIZE)
+
 if __name__ == "__main__":
+    if LTM_MODE == "shared":
+        # Load the shared agent while Gradio starts; the first request waits on the lock if needed.
+        threading.Thread(
+            target=get_session_agent, args=("shared_session",), name="ace-shared-init", daemon=True
+        ).start()
     print("Starting Gradio app...", flush=True)
     demo.launch(server_name="0.0.0.0", server_port=7860)
     print("Gradio app finished.", flush=True)
     
     # Optional: Cleanup workers on exit (though daemon=True handles this)
     if LTM_MODE == "isolated":
-        for sid, agent_data in agent_sessions.items():
-            print(f"Stopping worker for session {sid}...", flush=True)
-            agent_data["worker"].stop()
-            agent_data["worker"].join()
+        if shared_worker is not None:
+            print("Stopping session worker...", flush=True)
+            shared_worker.stop()
+            shared_worker.join()
     elif shared_agent:
         print("Stopping shared worker...", flush=True)
         shared_agent["worker"].stop()
@@ -3,46 +3,53 @@ import uuid
 import json
 import chainlit as cl
 from datetime import datetime
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 
 from ace_rm.ace_framework import (
     build_ace_agent, ACE_Memory, TaskQueue
 )
-from ace_rm.config import (
-    MODEL_NAME, BASE_URL, OPENAI_API_KEY, LLM_TEMPERATURE, LTM_MODE
-)
+from ace_rm.config import LTM_MODE
+from ace_rm.utils.llm_manager import get_llm
 
 # --- Configuration ---
 # You can adjust these or use environment variables
 RESPONSE_STYLE_DEFAULT = "detailed"
 
+# Shared LTM mode: one (memory, queue, agent) for every chat session. The compiled
+# graph is cached by build_ace_agent either way; this also skips reopening the
+# SQLite pools and FAISS index on each connection.
+_shared_agent = None
+
+
+def _create_agent(session_id=None):
+    llm = get_llm(streaming=True)
+    memory = ACE_Memory(session_id=session_id)
+    queue = TaskQueue(session_id=session_id)
+    return memory, queue, build_ace_agent(llm, memory, queue)
+
+
+def _get_agent(session_id):
+    global _shared_agent
+    if LTM_MODE != "shared":
+        return _create_agent(session_id)
+    if _shared_agent is None:
+        _shared_agent = _create_agent()
+    return _shared_agent
+
 @cl.on_chat_start
 async def start():
     # Use a fixed session ID for shared mode, or generate a new one for isolated mode
     session_id = "shared_session" if LTM_MODE == "shared" else str(uuid.uuid4())
     cl.user_session.set("session_id", session_id)
 
-    # Initialize LLM
-    llm = ChatOpenAI(
-        model=MODEL_NAME,
-        api_key=OPENAI_API_KEY,
-        base_url=BASE_URL,
-        temperature=LLM_TEMPERATURE,
-        streaming=True
-    )
-
-    # Initialize Memory and Queue
-    memory = ACE_Memory(session_id=session_id if LTM_MODE != "shared" else None)
-    queue = TaskQueue(session_id=session_id if LTM_MODE != "shared" else None)
-    
-    # Build Agent
-    agent = build_ace_agent(llm, memory, queue)
+    # Memory, Queue and Agent (reused across sessions in shared mode)
+    memory, queue, agent = _get_agent(session_id)
     
     cl.user_session.set("agent", agent)
     cl.user_session.set("memory", memory)
     cl.user_session.set("queue", queue)
     cl.user_session.set("history", [])
+    cl.user_session.set("human_turn_count", 0)
     cl.user_session.set("stm_model", {"constraints": [], "actions": [], "entities": []})
 
     # Welcome Message with Actions
@@ -62,6 +69,7 @@ async def on_reset(action):
     memory.clear()
     queue.clear()
     cl.user_session.set("history", [])
+    cl.user_session.set("human_turn_count", 0)
     cl.user_session.set("stm_model", {"constraints": [], "actions": [], "entities": []})
     await cl.Message(content="✅ メモリをリセットしました。").send()
 
@@ -80,12 +88,14 @@ async def main(message: cl.Message):
 
     # Add user message to history
     history.append(HumanMessage(content=message.content))
+    turn_count = cl.user_session.get("human_turn_count", 0) + 1
+    cl.user_session.set("human_turn_count", turn_count)
 
     # Prepare STM
     stm = {
         "current_time": datetime.now().isoformat(),
         "response_style": RESPONSE_STYLE_DEFAULT,
-        "turn_count": len([m for m in history if isinstance(m, HumanMessage)]),
+        "turn_count": turn_count,
         "model": stm_model
     }
 
@@ -153,7 +163,7 @@ async def main(message: cl.Message):
     cl.user_session.set("history", history)
 
     # Periodic LTM Status check
-    count = len(memory.get_all())
+    count = memory.count()
     # Instead of a full message, we can use a status message or similar if needed.
     # For now, let's just keep it simple.
 
@@ -21,14 +21,122 @@ OPENAI_API_KEY = os.environ.get("LLM_API_KEY") or os.environ.get("SAKURA_API_KEY
 # --- Embedding Model Configuration ---
 EMBEDDING_MODEL_NAME = os.environ.get("ACE_EMBEDDING_MODEL", "cl-nagoya/ruri-v3-30m")
 ACE_DEVICE = os.environ.get("ACE_DEVICE")  # Default is None for auto-detection
+# "torch" (default), "onnx" or "openvino". ONNX Runtime is markedly faster on CPU,
+# especially with an int8-quantized export selected via ACE_EMBEDDING_ONNX_FILE
+# (e.g. "onnx/model_qint8_avx512_vnni.onnx").
+EMBEDDING_BACKEND = os.environ.get("ACE_EMBEDDING_BACKEND", "torch").lower()
+EMBEDDING_ONNX_FILE = os.environ.get("ACE_EMBEDDING_ONNX_FILE")
+# Int8 dynamic quantization target for the "onnx" backend ("avx512_vnni", "avx512",
+# "avx2" or "arm64"). For models that ship no quantized export, one is created
+# once under EMBEDDING_EXPORT_DIR and loaded from there.
+EMBEDDING_QUANTIZATION = os.environ.get("ACE_EMBEDDING_QUANTIZATION", "").lower()
+EMBEDDING_EXPORT_DIR = os.environ.get("ACE_EMBEDDING_EXPORT_DIR", os.path.join("user_data", "models"))
+# Optional token cap for the encoder (e.g. 256). Shorter sequences encode faster;
+# longer text is truncated. Unset keeps the model's own limit.
+EMBEDDING_MAX_SEQ_LENGTH = int(os.environ["ACE_EMBEDDING_MAX_SEQ_LENGTH"]) if os.environ.get("ACE_EMBEDDING_MAX_SEQ_LENGTH") else None
+# Embeddings of recently encoded texts kept in memory. Document embeddings are also
+# cached in SQLite, up to EMBEDDING_CACHE_MAX_ROWS (oldest dropped first).
+EMBEDDING_CACHE_SIZE = int(os.environ.get("ACE_EMBEDDING_CACHE_SIZE", "4096"))
+EMBEDDING_CACHE_MAX_ROWS = int(os.environ.get("ACE_EMBEDDING_CACHE_MAX_ROWS", "50000"))
+# Concurrent single-text encodes are merged into one encoder call of up to this
+# many texts. A batch waits at most ENCODE_BATCH_WAIT_MS for more requests
+# (0: only merge requests already queued, adding no latency).
+ENCODE_BATCH_MAX_SIZE = int(os.environ.get("ACE_ENCODE_BATCH_MAX_SIZE", "32"))
+ENCODE_BATCH_WAIT_MS = float(os.environ.get("ACE_ENCODE_BATCH_WAIT_MS", "0"))
 
 # --- Search Configuration ---
-DISTANCE_METRIC = os.environ.get("ACE_DISTANCE_METRIC", "l2").lower()
+DISTANCE_METRIC = os.environ.get("ACE_DISTANCE_METRIC", "cosine").lower()
 _default_threshold = "0.7" if DISTANCE_METRIC == "cosine" else "1.8"
 DISTANCE_THRESHOLD = float(os.environ.get("ACE_DISTANCE_THRESHOLD", _default_threshold))
 
+# --- Vector Index Configuration ---
+# "hnsw" (default): approximate graph search, sublinear in memory size.
+# "flat": exact brute-force search.
+# "auto": exact flat search until FAISS_AUTO_HNSW_MIN_SIZE vectors, then HNSW.
+# "ivfpq": flat until IVFPQ_MIN_TRAIN_SIZE vectors, then a trained IVF index with
+#          product-quantized codes (a few dozen bytes per vector instead of 4*dim).
+# "hnsw_sq8": flat until SQ8_MIN_TRAIN_SIZE vectors, then HNSW over 8-bit scalar-
+#          quantized vectors (1 byte per dimension instead of 4, near-HNSW recall).
+FAISS_INDEX_TYPE = os.environ.get("ACE_FAISS_INDEX_TYPE", "hnsw").lower()
+# HNSW graph degree, build-time and query-time beam widths. Higher ef values
+# trade speed for recall; efSearch is applied on every load, so it can be
+# tuned without a rebuild.
+HNSW_M = int(os.environ.get("ACE_HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.environ.get("ACE_HNSW_EF_CONSTRUCTION", "80"))
+HNSW_EF_SEARCH = int(os.environ.get("ACE_HNSW_EF_SEARCH", "64"))
+# HNSW cannot delete, so replaced vectors stay in the graph (skipped by searches)
+# until they make up this fraction of it; the index is then rebuilt on its next write.
+HNSW_COMPACT_RATIO = 0.2
+FAISS_AUTO_HNSW_MIN_SIZE = int(os.environ.get("ACE_FAISS_AUTO_HNSW_MIN_SIZE", "10000"))
+IVFPQ_NLIST = 256
+IVFPQ_NPROBE = 8
+IVFPQ_MIN_TRAIN_SIZE = 4096
+SQ8_MIN_TRAIN_SIZE = 1024
+# Memory-map the index file read-only for searching instead of loading it into RAM.
+# Writes then reload a private copy, so enable this for read-heavy, multi-process setups.
+FAISS_MMAP = os.environ.get("ACE_FAISS_MMAP", "false").lower() == "true"
+
+# Newly added vectors are buffered in memory and merged into the index file
+# once this many accumulate or the oldest has waited this many seconds.
+INDEX_FLUSH_BATCH_SIZE = int(os.environ.get("ACE_INDEX_FLUSH_BATCH_SIZE", "32"))
+INDEX_FLUSH_INTERVAL = float(os.environ.get("ACE_INDEX_FLUSH_INTERVAL", "2.0"))
+# Flushes are appended to an index change log (<index>.wal) instead of rewriting
+# the index file; the log is folded into the file once it exceeds this size.
+INDEX_LOG_MAX_BYTES = int(float(os.environ.get("ACE_INDEX_LOG_MAX_MB", "8")) * 1024 * 1024)
+
+# --- Agent Configuration ---
+# Let the Curator draft the answer in the same (structured-output) LLM call as its
+# intent analysis; the draft is returned directly when retrieval finds nothing.
+CURATOR_FUSED = os.environ.get("ACE_CURATOR_FUSED", "false").lower() == "true"
+# Skip the Curator's intent-analysis LLM call for short inputs and greetings
+# (plain retrieval on the raw input instead).
+CURATOR_SKIP_SIMPLE = os.environ.get("ACE_CURATOR_SKIP_SIMPLE", "false").lower() == "true"
+# Don't queue greeting/acknowledgement turns ("ok", "thanks", ...) for reflection;
+# they never yield a lesson but cost a background LLM call each.
+REFLECT_SKIP_TRIVIAL = os.environ.get("ACE_REFLECT_SKIP_TRIVIAL", "false").lower() == "true"
+# Request schema-validated output (llm.with_structured_output) for the Curator's
+# intent analysis and the BackgroundWorker's reflection instead of parsing JSON
+# out of free text. Needs a backend with tool calling / JSON schema support.
+STRUCTURED_OUTPUT = os.environ.get("ACE_STRUCTURED_OUTPUT", "false").lower() == "true"
+# Semantic response cache (Gradio app): a message whose embedding has at least this
+# cosine similarity to an earlier one, with the same response style and recent
+# turns, is answered with the earlier reply without running the graph.
+RESPONSE_CACHE = os.environ.get("ACE_RESPONSE_CACHE", "false").lower() == "true"
+RESPONSE_CACHE_THRESHOLD = float(os.environ.get("ACE_RESPONSE_CACHE_THRESHOLD", "0.95"))
+RESPONSE_CACHE_SIZE = int(os.environ.get("ACE_RESPONSE_CACHE_SIZE", "1024"))
+# "int8" stores cached query embeddings as int8 with a per-vector scale (4x smaller).
+RESPONSE_CACHE_QUANT = os.environ.get("ACE_RESPONSE_CACHE_QUANT", "none").lower()
+
+# --- Background Worker Configuration ---
+# Number of queued tasks whose LLM calls may be in flight at once (capped at 16 to
+# keep SQLite write contention well inside busy_timeout).
+WORKER_CONCURRENCY = min(16, int(os.environ.get("ACE_WORKER_CONCURRENCY", "4")))
+# Upper bound (seconds) of the worker's idle backoff. Same-process enqueues
+# wake it immediately; this only bounds pickup latency for tasks enqueued
+# by another process. 0 makes an idle worker sleep until it is signalled
+# (no periodic wakeups), for deployments where only this process enqueues.
+WORKER_MAX_IDLE_WAIT = float(os.environ.get("ACE_WORKER_MAX_IDLE_WAIT", "30.0"))
+# Seconds during which re-enqueueing the same (input, output) pair as the
+# previous task is ignored (double submits, retries). 0 disables.
+ENQUEUE_DEDUP_WINDOW = float(os.environ.get("ACE_ENQUEUE_DEDUP_WINDOW", "60"))
+# Hours a cached Reflector/Curator analysis is reused; older entries are
+# deleted whenever a new one is stored.
+ANALYSIS_CACHE_TTL_HOURS = float(os.environ.get("ACE_ANALYSIS_CACHE_TTL_HOURS", "24"))
+
 # --- Language Configuration ---
 ACE_LANG = os.environ.get("ACE_LANG", "en").lower()
 
 # --- LTM Mode Configuration ---
 LTM_MODE = os.environ.get("LTM_MODE", "shared").lower()
+# Isolated mode: max live session agents, and seconds of inactivity before a
+# session's agent (worker thread, index, connections) is released.
+# Its memory stays on disk and is reloaded if the session returns.
+SESSION_MAX_AGENTS = int(os.environ.get("ACE_SESSION_MAX_AGENTS", "256"))
+SESSION_TTL = float(os.environ.get("ACE_SESSION_TTL", "3600"))
+
+# --- UI Server Configuration ---
+# Gradio events (chat turns, table refreshes) handled concurrently per event
+# listener, and max requests waiting in the queue before new ones are rejected.
+# Chat turns are async and mostly wait on the LLM, so they overlap well.
+UI_CONCURRENCY = int(os.environ.get("ACE_UI_CONCURRENCY", "16"))
+UI_QUEUE_SIZE = int(os.environ.get("ACE_UI_QUEUE_SIZE", "64"))
@@ -1,15 +1,69 @@
 import os
+import re
 import sqlite3
-import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import numpy as np
 import faiss
-from typing import List, Optional, Tuple, Dict, Any
+from typing import Iterable, Iterator, List, Optional, Tuple, Dict, Any
 from filelock import FileLock
 
 from ace_rm.config import (
-    DB_PATH, FAISS_INDEX_PATH, DISTANCE_METRIC, DISTANCE_THRESHOLD, EMBEDDING_MODEL_NAME
+    DB_PATH, FAISS_INDEX_PATH, DISTANCE_METRIC, DISTANCE_THRESHOLD, EMBEDDING_MODEL_NAME,
+    FAISS_INDEX_TYPE, FAISS_MMAP, INDEX_FLUSH_BATCH_SIZE, INDEX_FLUSH_INTERVAL, INDEX_LOG_MAX_BYTES,
+    EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_MAX_ROWS
 )
-from ace_rm.utils.embedding_manager import get_embedding_model
+from ace_rm.memory import index_log
+from ace_rm.memory.embedding_cache import EmbeddingCache
+from ace_rm.memory.vector_index import (
+    Tombstones, convert_index, create_index, matches_index_type, maybe_compact_index, maybe_upgrade_index,
+    read_index, replace_vectors, upgrade_due, write_index
+)
+from ace_rm.utils.db_manager import ConnectionPool, columnar
+from ace_rm.utils.json_utils import dumps_compact, parse_llm_json
+from ace_rm.utils.embedding_manager import get_embedding_model, get_encode_batcher
+
+# Mini-batch size used when re-encoding the whole document table.
+REBUILD_BATCH_SIZE = 64
+# Rows streamed from SQLite per encode/add step, bounding rebuild memory.
+REBUILD_CHUNK_SIZE = 1024
+# Rank offset for reciprocal rank fusion of vector and FTS results.
+RRF_K = 60
+# Anything that is not a word character or whitespace is FTS5 syntax to us.
+_FTS_SAFE_RE = re.compile(r'[^\w\s]+')
+_FTS_KEYWORDS = frozenset({'AND', 'OR', 'NOT', 'NEAR'})
+
+# Re-indexes FTS only when a tokenized column changed, so timestamp or
+# no-op updates do not pay for an FTS delete + insert.
+_FTS_UPDATE_TRIGGER_SQL = """
+CREATE TRIGGER IF NOT EXISTS documents_au AFTER UPDATE ON documents
+WHEN new.content IS NOT old.content OR new.entities IS NOT old.entities OR new.problem_class IS NOT old.problem_class
+BEGIN
+    INSERT INTO documents_fts(documents_fts, rowid, content, entities, problem_class) VALUES('delete', old.id, old.content, old.entities, old.problem_class);
+    INSERT INTO documents_fts(rowid, content, entities, problem_class) VALUES (new.id, new.content, new.entities, new.problem_class);
+END;
+"""
+
+_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    content TEXT,
+    entities TEXT,
+    problem_class TEXT,
+    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_documents_problem_class ON documents(problem_class);
+-- Small per-session values that outlive the in-process agent (e.g. the STM world model).
+CREATE TABLE IF NOT EXISTS session_state (key TEXT PRIMARY KEY, value TEXT);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(content, entities, problem_class, content='documents', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS documents_ai AFTER INSERT ON documents BEGIN
+    INSERT INTO documents_fts(rowid, content, entities, problem_class) VALUES (new.id, new.content, new.entities, new.problem_class);
+END;
+CREATE TRIGGER IF NOT EXISTS documents_ad AFTER DELETE ON documents BEGIN
+    INSERT INTO documents_fts(documents_fts, rowid, content, entities, problem_class) VALUES('delete', old.id, old.content, old.entities, old.problem_class);
+END;
+""" + _FTS_UPDATE_TRIGGER_SQL
 
 class ACE_Memory:
     """Long-Term Memory (LTM) management class.
@@ -31,73 +85,265 @@ class ACE_Memory:
             self.index_path = FAISS_INDEX_PATH
         
         self.index_lock_path = f"{self.index_path}.lock"
+        self.index_log_path = f"{self.index_path}.wal"
         self.last_index_mtime = 0.0
+        # Bytes of the change log applied to self.index / last seen on disk.
+        self.last_log_offset = 0
+        self.last_log_size = 0
 
         self.distance_metric = DISTANCE_METRIC
         self.distance_threshold = DISTANCE_THRESHOLD
+        self.index_type = FAISS_INDEX_TYPE
 
         self.encoder_name = EMBEDDING_MODEL_NAME
         # Use shared embedding model
         self.encoder = get_embedding_model()
+        # Single-text encodes go through the shared micro-batcher.
+        self._batcher = get_encode_batcher()
         self.dimension = self.encoder.get_sentence_embedding_dimension()
         self.use_prefixes = "ruri" in self.encoder_name.lower()
-
+        # Cosine similarity is an inner product over unit vectors, so normalize at encode time.
+        self.normalize_embeddings = self.distance_metric == 'cosine'
+
+        # Write-behind buffer: vectors added since the last index flush.
+        self._pending_vectors: List[np.ndarray] = []
+        self._pending_ids: List[int] = []
+        # Ids whose indexed vector is superseded by one in the buffer.
+        self._pending_removals: set = set()
+        self._pending_lock = threading.Lock()
+        # The in-memory index is the source of truth; the file is only reloaded
+        # when another process has written it since we last did.
+        self._index_lock = threading.RLock()
+        # True while self.index is a read-only memory map of the index file.
+        self._index_mmapped = False
+        # Replaced HNSW vectors to skip when searching; rebuilt when self.index changes.
+        self._tombstones: Optional[Tombstones] = None
+
+        self._pool = ConnectionPool(self.db_path)
+        # Incremented after every committed write through this instance, so
+        # views can tell cheaply whether anything changed since they last read.
+        self.data_version = 0
         self._init_db()
+        self._embedding_cache = EmbeddingCache(
+            self._pool, f"{self.encoder_name}|{self.normalize_embeddings}", EMBEDDING_CACHE_SIZE,
+            EMBEDDING_CACHE_MAX_ROWS
+        )
         self._load_or_build_index()
 
+    def _connect(self) -> sqlite3.Connection:
+        """Returns the calling thread's persistent read connection."""
+        return self._pool.reader()
+
+    @contextmanager
+    def _write(self) -> Iterator[sqlite3.Connection]:
+        """Context manager yielding the serialized write connection; bumps data_version on commit.
+
+        Transactions that changed no rows (e.g. an idle worker's empty claim) leave it as is.
+        """
+        with self._pool.writer() as conn:
+            changes = conn.total_changes
+            yield conn
+            changed = conn.total_changes != changes
+        if changed:
+            self.data_version += 1
+
+    def close(self):
+        """Flushes buffered vectors and closes the pooled SQLite connections owned by this thread."""
+        self.flush()
+        self._pool.close()
+
     def _init_db(self):
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("PRAGMA journal_mode=WAL;")
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS documents (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    content TEXT,
-                    entities TEXT,
-                    problem_class TEXT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(content, entities, problem_class, content='documents', content_rowid='id')")
-            conn.execute("CREATE TRIGGER IF NOT EXISTS documents_ai AFTER INSERT ON documents BEGIN INSERT INTO documents_fts(rowid, content, entities, problem_class) VALUES (new.id, new.content, new.entities, new.problem_class); END;")
-            conn.execute("CREATE TRIGGER IF NOT EXISTS documents_ad AFTER DELETE ON documents BEGIN INSERT INTO documents_fts(documents_fts, rowid, content, entities, problem_class) VALUES('delete', old.id, old.content, old.entities, old.problem_class); END;")
-            conn.execute("CREATE TRIGGER IF NOT EXISTS documents_au AFTER UPDATE ON documents BEGIN INSERT INTO documents_fts(documents_fts, rowid, content, entities, problem_class) VALUES('delete', old.id, old.content, old.entities, old.problem_class); INSERT INTO documents_fts(rowid, content, entities, problem_class) VALUES (new.id, new.content, new.entities, new.problem_class); END;")
+        with self._write() as conn:
+            conn.executescript(_SCHEMA_SQL)
+            # Databases created before the update trigger gained its WHEN clause.
+            row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'documents_au'").fetchone()
+            if row is not None and " WHEN " not in row[0]:
+                conn.executescript("DROP TRIGGER documents_au;" + _FTS_UPDATE_TRIGGER_SQL)
 
     def _load_or_build_index(self):
         with FileLock(self.index_lock_path):
+            needs_persist = True
             if os.path.exists(self.index_path):
                 try:
-                    self.index = faiss.read_index(self.index_path)
+                    self.index = self._read_index(writable=True)
+                    self.last_index_mtime = os.path.getmtime(self.index_path)
+                    self._replay_log(0)
+                    needs_persist = self.last_log_size > 0
                 except Exception:
                     self._create_empty_index()
                     self._rebuild_vectors_from_db()
+                if not self._index_matches_config():
+                    # Index was built with another metric/model; re-embed from the DB.
+                    self._create_empty_index()
+                    self._rebuild_vectors_from_db()
+                    needs_persist = True
+                elif not matches_index_type(self.index, self.index_type):
+                    # ACE_FAISS_INDEX_TYPE changed; reuse the stored vectors unless they are quantized.
+                    converted = convert_index(self.index, self.distance_metric, self.index_type)
+                    if converted is None:
+                        self._create_empty_index()
+                        self._rebuild_vectors_from_db()
+                    else:
+                        self.index = converted
+                    needs_persist = True
+                elif self._index_missing_documents():
+                    needs_persist = True
             else:
                 self._create_empty_index()
                 self._rebuild_vectors_from_db()
-                faiss.write_index(self.index, self.index_path)
-            
-            if os.path.exists(self.index_path):
-                self.last_index_mtime = os.path.getmtime(self.index_path)
 
-    def _create_empty_index(self):
-        if self.distance_metric == 'cosine':
-            self.index = faiss.IndexIDMap(faiss.IndexFlatIP(self.dimension))
+            if needs_persist:
+                # Also folds any change log left by earlier runs into the file.
+                self._persist_index()
+            elif FAISS_MMAP:
+                self.index = self._read_index()
+
+    def _read_index(self, writable: bool = False) -> faiss.Index:
+        """Reads the index file, memory-mapped when ACE_FAISS_MMAP is set and no write is planned."""
+        mmap = FAISS_MMAP and not writable
+        index = read_index(self.index_path, mmap=mmap)
+        self._index_mmapped = mmap
+        return index
+
+    def _replay_log(self, offset: int):
+        """Applies change-log blocks written after `offset` to self.index. Call with the FileLock held.
+
+        Replay is idempotent: ids already present (a block that was folded into
+        the index file just before a crash) are not added twice.
+        """
+        self.last_log_size = index_log.log_size(self.index_log_path)
+        present = None
+        for removed, ids, vectors, end in index_log.read_blocks(self.index_log_path, self.index.d, offset):
+            if present is None:
+                present = set(faiss.vector_to_array(self.index.id_map).tolist())
+            present.difference_update(removed.tolist())
+            new = np.fromiter((i not in present for i in ids.tolist()), dtype=bool, count=len(ids))
+            self.index = replace_vectors(self.index, removed, ids[new], vectors[new])
+            present.update(ids[new].tolist())
+            offset = end
+        self.last_log_offset = offset
+
+    def _prepare_index_for_write(self):
+        """Ensures self.index is an up-to-date, writable copy. Call with the FileLock held."""
+        if self._index_mmapped:
+            self.index = self._read_index(writable=True)
+            self.last_index_mtime = os.path.getmtime(self.index_path)
+            self._replay_log(0)
         else:
-            self.index = faiss.IndexIDMap(faiss.IndexFlatL2(self.dimension))
+            self._reload_if_stale()
+
+    def _reload_if_stale(self):
+        """Picks up another process's compaction or log appends. Call with the FileLock held."""
+        try:
+            current_mtime = os.path.getmtime(self.index_path)
+        except OSError:
+            return
+        current_log_size = index_log.log_size(self.index_log_path)
+        try:
+            if current_mtime > self.last_index_mtime or current_log_size < self.last_log_offset:
+                # Log appends cannot go into a read-only memory map.
+                self.index = self._read_index(writable=current_log_size > 0)
+                self.last_index_mtime = current_mtime
+                self._replay_log(0)
+            elif current_log_size != self.last_log_size:
+                if self._index_mmapped:
+                    self._prepare_index_for_write()
+                else:
+                    self._replay_log(self.last_log_offset)
+        except Exception:
+            pass
+
+    def _refresh_index(self):
+        """Picks up index writes from other processes; two cheap stat() calls when nothing changed."""
+        try:
+            if (os.path.getmtime(self.index_path) <= self.last_index_mtime
+                    and index_log.log_size(self.index_log_path) == self.last_log_size):
+                return
+        except OSError:
+            return
+        with self._index_lock, FileLock(self.index_lock_path):
+            self._reload_if_stale()
+
+    def _persist_index(self):
+        """Writes the in-memory index to disk and empties the change log. Call with the FileLock held."""
+        self.index = maybe_upgrade_index(maybe_compact_index(self.index), self.index_type)
+        write_index(self.index, self.index_path)
+        # A crash between these two steps is harmless: log replay is idempotent.
+        index_log.truncate(self.index_log_path)
+        self.last_index_mtime = os.path.getmtime(self.index_path)
+        self.last_log_offset = self.last_log_size = 0
+        if FAISS_MMAP:
+            # Swap the private copy for a read-only mapping of what was just written.
+            self.index = self._read_index()
+
+    def _index_matches_config(self) -> bool:
+        expected_metric = faiss.METRIC_INNER_PRODUCT if self.distance_metric == 'cosine' else faiss.METRIC_L2
+        return self.index.d == self.dimension and self.index.metric_type == expected_metric
+
+    def _create_empty_index(self):
+        self.index = create_index(self.dimension, self.distance_metric, self.index_type)
+        self._index_mmapped = False
 
     def _rebuild_vectors_from_db(self):
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, content FROM documents")
+            self._index_row_chunks(iter(lambda: cursor.fetchmany(REBUILD_CHUNK_SIZE), []))
+
+    def _index_missing_documents(self) -> bool:
+        """Indexes documents whose vectors never reached the index file.
+
+        This happens when the process exits with vectors still in the
+        write-behind buffer. Returns True if any documents were indexed.
+        """
+        if not hasattr(self.index, "id_map"):
+            return False
+        indexed_ids = set(faiss.vector_to_array(self.index.id_map).tolist())
+        with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT id, content FROM documents")
-            rows = cursor.fetchall()
-            if rows:
-                contents = [r[1] for r in rows]
-                if self.use_prefixes:
-                    contents = ["検索文書: " + c for c in contents]
-                embeddings = self.encoder.encode(contents)
-                if self.distance_metric == 'cosine':
-                    faiss.normalize_L2(embeddings)
-                ids = np.array([r[0] for r in rows])
-                self.index.add_with_ids(np.array(embeddings).astype('float32'), ids)
+            chunks = iter(lambda: cursor.fetchmany(REBUILD_CHUNK_SIZE), [])
+            return self._index_row_chunks([r for r in chunk if r[0] not in indexed_ids] for chunk in chunks)
+
+    def _index_row_chunks(self, chunks: Iterable[List[Tuple[int, str]]]) -> bool:
+        """Encodes and indexes (id, content) row chunks as a two-stage pipeline.
+
+        Chunk N is added to FAISS on a helper thread while chunk N+1 is being
+        encoded; both release the GIL, so rebuild time approaches the slower
+        stage rather than the sum. Returns True if any rows were indexed.
+        """
+        pending = None
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="ace-index-add") as add_pool:
+            for rows in chunks:
+                if not rows:
+                    continue
+                embeddings = self._encode_documents([r[1] for r in rows])
+                ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+                if pending is not None:
+                    pending.result()  # One add in flight: FAISS indexes are not safe for concurrent adds.
+                pending = add_pool.submit(self.index.add_with_ids, embeddings, ids)
+            if pending is not None:
+                pending.result()
+        return pending is not None
+
+    def _encode_documents(self, contents: List[str]) -> np.ndarray:
+        """Encodes document texts as a contiguous float32 matrix in input order."""
+        if self.use_prefixes:
+            contents = ["検索文書: " + c for c in contents]
+        # Smart batching: encode length-sorted texts so each mini-batch
+        # pads to a similar length, then restore the original order.
+        order = sorted(range(len(contents)), key=lambda i: len(contents[i]))
+        sorted_embeddings = self.encoder.encode(
+            [contents[i] for i in order],
+            batch_size=REBUILD_BATCH_SIZE,
+            show_progress_bar=False,
+            convert_to_numpy=True,
+            normalize_embeddings=self.normalize_embeddings,
+        )
+        # The scatter into a fresh C-ordered float32 buffer is the only copy.
+        embeddings = np.empty(sorted_embeddings.shape, dtype=np.float32)
+        embeddings[order] = sorted_embeddings
+        return embeddings
 
     def add(self, content: str, entities: List[str] = [], problem_class: str = ""):
         """Adds a new document to the memory.
@@ -107,8 +353,8 @@ class ACE_Memory:
             entities: A list of entities related to the document.
             problem_class: The abstract problem class or category.
         """
-        entities_json = json.dumps(entities)
-        with sqlite3.connect(self.db_path) as conn:
+        entities_json = dumps_compact(entities)
+        with self._write() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 "INSERT INTO documents (content, entities, problem_class) VALUES (?, ?, ?)",
@@ -116,59 +362,149 @@ class ACE_Memory:
             )
             doc_id = cursor.lastrowid
 
-        encoded_content = "検索文書: " + content if self.use_prefixes else content
-        vector = self.encoder.encode([encoded_content])
-        
-        with FileLock(self.index_lock_path):
-            if os.path.exists(self.index_path):
-                try:
-                    self.index = faiss.read_index(self.index_path)
-                except Exception:
-                    self._create_empty_index()
-            
-            if self.distance_metric == 'cosine':
-                faiss.normalize_L2(vector)
-            self.index.add_with_ids(np.array(vector).astype('float32'), np.array([doc_id]))
-            faiss.write_index(self.index, self.index_path)
-            self.last_index_mtime = os.path.getmtime(self.index_path)
+        vector = self._encode_one("検索文書: " + content if self.use_prefixes else content, persist=True)
+        self._buffer_vector(vector[0], doc_id)
 
-    def add_batch(self, items: List[Dict[str, Any]]):
-        """Optimized batch insertion."""
-        if not items:
-            return
-        
-        contents = [item['content'] for item in items]
-        entities_list = [json.dumps(item.get('entities', [])) for item in items]
-        p_classes = [item.get('problem_class', '') for item in items]
-        
-        # 1. DB write in one transaction
-        doc_ids = []
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            for content, ent_json, p_class in zip(contents, entities_list, p_classes):
-                cursor.execute(
-                    "INSERT INTO documents (content, entities, problem_class) VALUES (?, ?, ?)",
-                    (content, ent_json, p_class)
+    def _encode_one(self, text: str, persist: bool = False) -> np.ndarray:
+        """Encodes a single text as a (1, d) C-contiguous float32 array, copying only if needed.
+
+        Repeated texts are served from the embedding cache; misses are encoded
+        together with any concurrent requests by the shared micro-batcher.
+        `persist` also writes a miss to the SQLite cache (documents, not queries).
+        """
+        cached = self._embedding_cache.get(text)
+        if cached is not None:
+            return cached.reshape(1, -1)
+        vector = self._batcher.encode(text, self.normalize_embeddings).reshape(1, -1).astype(np.float32, copy=False)
+        if not vector.flags['C_CONTIGUOUS']:
+            vector = np.ascontiguousarray(vector)
+        self._embedding_cache.put(text, vector[0], persist=persist)
+        return vector
+
+    def embed_query(self, query: str) -> np.ndarray:
+        """Returns the (d,) embedding search() uses for `query` (served from the embedding cache when repeated)."""
+        return self._encode_one("検索クエリ: " + query if self.use_prefixes else query)[0]
+
+    def _buffer_vector(self, vector: np.ndarray, doc_id: int, replace: bool = False):
+        """Queues a vector for the next index flush instead of rewriting the index file.
+
+        With `replace`, the document's current vector (indexed or still pending)
+        is superseded: it is masked from searches now and removed at flush time.
+        """
+        with self._pending_lock:
+            if not self._pending_ids:
+                timer = threading.Timer(INDEX_FLUSH_INTERVAL, self.flush)
+                timer.daemon = True
+                timer.start()
+            if replace:
+                if doc_id in self._pending_ids:
+                    keep = [i for i, pid in enumerate(self._pending_ids) if pid != doc_id]
+                    self._pending_vectors = [self._pending_vectors[i] for i in keep]
+                    self._pending_ids = [self._pending_ids[i] for i in keep]
+                self._pending_removals.add(doc_id)
+            self._pending_vectors.append(vector)
+            self._pending_ids.append(doc_id)
+            batch_full = len(self._pending_ids) >= INDEX_FLUSH_BATCH_SIZE
+        if batch_full:
+            self.flush()
+
+    def flush(self):
+        """Merges buffered vectors into the FAISS index and logs the change (see `_write_vectors`)."""
+        with self._pending_lock:
+            if not self._pending_ids:
+                return
+            removed = np.fromiter(self._pending_removals, dtype=np.int64, count=len(self._pending_removals))
+            ids = np.asarray(self._pending_ids, dtype=np.int64)
+            vectors = np.vstack(self._pending_vectors)
+            self._write_vectors(removed, ids, vectors)
+            self._pending_vectors = []
+            self._pending_ids = []
+            self._pending_removals = set()
+
+    def _write_vectors(self, removed: np.ndarray, ids: np.ndarray, vectors: np.ndarray):
+        """Applies a change to the index and appends it to the change log.
+
+        The full index file is only rewritten once the log exceeds
+        ACE_INDEX_LOG_MAX_MB (or an index upgrade is due).
+        """
+        with self._index_lock, FileLock(self.index_lock_path):
+            # Changes are replayed onto the freshest index, so writes made by
+            # other processes since our last flush are kept.
+            self._prepare_index_for_write()
+            self.index = replace_vectors(self.index, removed, ids, vectors)
+            if self.last_log_offset >= INDEX_LOG_MAX_BYTES or upgrade_due(self.index, self.index_type):
+                self._persist_index()
+            else:
+                self.last_log_offset = self.last_log_size = index_log.append_block(
+                    self.index_log_path, self.last_log_offset, removed, ids, vectors
                 )
-                doc_ids.append(cursor.lastrowid)
 
-        # 2. Batch Encoding
-        prefixed_contents = ["検索文書: " + c for c in contents] if self.use_prefixes else contents
-        vectors = self.encoder.encode(prefixed_contents)
+    def _score_pending(self, query_vec: np.ndarray) -> List[Tuple[int, float]]:
+        """Brute-force scores the (small) write-behind buffer. Call with _pending_lock held."""
+        if not self._pending_ids:
+            return []
+        pending = np.vstack(self._pending_vectors)
         if self.distance_metric == 'cosine':
-            faiss.normalize_L2(vectors)
-        
-        # 3. Batch Index update
-        with FileLock(self.index_lock_path):
-            if os.path.exists(self.index_path):
-                try:
-                    self.index = faiss.read_index(self.index_path)
-                except Exception:
-                    self._create_empty_index()
-            
-            self.index.add_with_ids(np.array(vectors).astype('float32'), np.array(doc_ids))
-            faiss.write_index(self.index, self.index_path)
-            self.last_index_mtime = os.path.getmtime(self.index_path)
+            scores = pending @ query_vec[0]
+        else:
+            scores = ((pending - query_vec[0]) ** 2).sum(axis=1)
+        return list(zip(self._pending_ids, scores.tolist()))
+
+    def _search_vectors(self, query_vec: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        """Searches the index and the write-behind buffer, best matches first."""
+        hits = []
+        # Same lock order as flush(), so a search never sees a half-applied flush.
+        with self._pending_lock, self._index_lock:
+            if self.index.ntotal > 0:
+                masked = self._pending_removals
+                search_k = min(k + len(masked), self.index.ntotal)
+                if self._tombstones is None or not self._tombstones.is_current(self.index):
+                    self._tombstones = Tombstones(self.index)
+                distances, indices = self._tombstones.search(query_vec, search_k)
+                hits = [
+                    (int(idx), float(dist)) for dist, idx in zip(distances[0], indices[0])
+                    if idx >= 0 and idx not in masked
+                ]
+            hits.extend(self._score_pending(query_vec))
+        hits.sort(key=lambda hit: hit[1], reverse=self.distance_metric == 'cosine')
+        return hits[:k]
+
+    def _passes_threshold(self, score: float, threshold: float) -> bool:
+        if self.distance_metric == 'cosine':
+            return score > threshold
+        return score < threshold
+
+    def add_many(self, items: List[Tuple[str, List[str], str]]) -> List[int]:
+        """Adds several documents with one transaction, one encode pass and one change-log append.
+
+        Args:
+            items: (content, entities, problem_class) tuples.
+
+        Returns:
+            The ids assigned to the new documents, in input order.
+        """
+        if not items:
+            return []
+
+        with self._write() as conn:
+            conn.executemany(
+                "INSERT INTO documents (content, entities, problem_class) VALUES (?, ?, ?)",
+                [(content, dumps_compact(entities), p_class) for content, entities, p_class in items]
+            )
+            # The write transaction is held, so the AUTOINCREMENT ids are contiguous.
+            last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+        doc_ids = np.arange(last_id - len(items) + 1, last_id + 1, dtype=np.int64)
+
+        vectors = self._encode_documents([content for content, _, _ in items])
+        self._write_vectors(np.empty(0, dtype=np.int64), doc_ids, vectors)
+        return doc_ids.tolist()
+
+    def add_batch(self, items: List[Dict[str, Any]]):
+        """Optimized batch insertion."""
+        self.add_many([
+            (item['content'], item.get('entities', []), item.get('problem_class', ''))
+            for item in items
+        ])
 
     def find_similar_vectors(self, content: str, threshold: float = 0.3) -> List[Tuple[int, float]]:
         """Finds documents similar to the given content using vector search.
@@ -180,81 +516,43 @@ class ACE_Memory:
         Returns:
             A list of tuples containing (doc_id, distance/similarity).
         """
-        encoded_content = "検索クエリ: " + content if self.use_prefixes else content
-        vector = self.encoder.encode([encoded_content])
-        
-        with FileLock(self.index_lock_path):
-            if os.path.exists(self.index_path):
-                 try:
-                    current_mtime = os.path.getmtime(self.index_path)
-                    if current_mtime > self.last_index_mtime:
-                        self.index = faiss.read_index(self.index_path)
-                        self.last_index_mtime = current_mtime
-                 except Exception:
-                    pass
-
-            if self.index.ntotal > 0:
-                distances, indices = self.index.search(np.array(vector).astype('float32'), 3)
-                results = []
-                for i in range(len(indices[0])):
-                    idx = indices[0][i]
-                    dist = distances[0][i]
-                    if idx >= 0:
-                        if self.distance_metric == 'cosine':
-                            if dist > threshold:
-                                results.append((int(idx), float(dist)))
-                        else:
-                            if dist < threshold:
-                                results.append((int(idx), float(dist)))
-                return results
-        return []
+        vector = self._encode_one("検索クエリ: " + content if self.use_prefixes else content)
+        self._refresh_index()
+        hits = self._search_vectors(vector, 3)
+        return [(doc_id, dist) for doc_id, dist in hits if self._passes_threshold(dist, threshold)]
 
     def get_document_by_id(self, doc_id: int) -> Optional[Dict[str, Any]]:
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self._connect() as conn:
             cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
             cursor.execute("SELECT * FROM documents WHERE id = ?", (doc_id,))
             row = cursor.fetchone()
             return dict(row) if row else None
 
     def update_document(self, doc_id: int, content: str, entities: List[str], problem_class: str):
-        entities_json = json.dumps(entities)
-        with sqlite3.connect(self.db_path) as conn:
+        """Updates a document, re-embedding it only if its content changed."""
+        entities_json = dumps_compact(entities)
+        with self._write() as conn:
+            row = conn.execute("SELECT content FROM documents WHERE id = ?", (doc_id,)).fetchone()
             conn.execute(
                 "UPDATE documents SET content = ?, entities = ?, problem_class = ?, timestamp = CURRENT_TIMESTAMP WHERE id = ?",
                 (content, entities_json, problem_class, doc_id)
             )
+        if row is not None and row[0] == content:
+            # Metadata-only update: the indexed vector is still correct.
+            return
 
-        encoded_content = "検索文書: " + content if self.use_prefixes else content
-        vector = self.encoder.encode([encoded_content])
-        
-        with FileLock(self.index_lock_path):
-            if os.path.exists(self.index_path):
-                self.index = faiss.read_index(self.index_path)
-            
-            self.index.remove_ids(np.array([doc_id]).astype('int64'))
-            if self.distance_metric == 'cosine':
-                faiss.normalize_L2(vector)
-            self.index.add_with_ids(np.array(vector).astype('float32'), np.array([doc_id]))
-            faiss.write_index(self.index, self.index_path)
-            self.last_index_mtime = os.path.getmtime(self.index_path)
+        vector = self._encode_one("検索文書: " + content if self.use_prefixes else content, persist=True)
+        self._buffer_vector(vector[0], doc_id, replace=True)
 
     def _sanitize_query(self, query: str) -> str:
-        """Sanitizes the query string for FTS5 to prevent SQL errors."""
-        import re
-        # Remove characters that have special meaning in FTS5 search patterns
-        # We replace them with spaces to avoid breaking the query
-        special_chars = ['"', '*', ':', '(', ')']
-        sanitized = query
-        for char in special_chars:
-            sanitized = sanitized.replace(char, ' ')
-
-        # Also remove FTS5 keywords if they appear as standalone words
-        keywords = ['AND', 'OR', 'NOT', 'NEAR']
-        for kw in keywords:
-            sanitized = re.sub(rf'\b{kw}\b', ' ', sanitized, flags=re.IGNORECASE)
-
-        return ' '.join(sanitized.split())
+        """Builds an FTS5 MATCH expression that cannot raise a syntax error.
+
+        Operator characters and keywords are dropped and every remaining token
+        is quoted, so the tokens are simply ANDed together.
+        """
+        tokens = _FTS_SAFE_RE.sub(' ', query).split()
+        return ' '.join(f'"{token}"' for token in tokens if token.upper() not in _FTS_KEYWORDS)
 
     def search(self, query: str, k: int = 3, distance_threshold: float = None) -> List[str]:
         """Performs a hybrid search (vector + FTS5) for relevant documents.
@@ -267,85 +565,121 @@ class ACE_Memory:
         Returns:
             A list of document contents.
         """
-        if os.path.exists(self.index_path):
-            current_mtime = os.path.getmtime(self.index_path)
-            if current_mtime > self.last_index_mtime:
-                with FileLock(self.index_lock_path):
-                     try:
-                        self.index = faiss.read_index(self.index_path)
-                        self.last_index_mtime = current_mtime
-                     except Exception:
-                        pass
+        self._refresh_index()
         if distance_threshold is None:
             distance_threshold = self.distance_threshold
             
-        results = {}
-        if self.index.ntotal > 0:
-            encoded_query = "検索クエリ: " + query if self.use_prefixes else query
-            query_vec = self.encoder.encode([encoded_query])
-            search_k = min(k * 3, self.index.ntotal)  
-            distances, indices = self.index.search(np.array(query_vec).astype('float32'), search_k)
-            
-            found_ids = []
-            for distance, idx in zip(distances[0], indices[0]):
-                if idx >= 0:
-                    if self.distance_metric == 'cosine':
-                        if distance > distance_threshold:
-                            found_ids.append(int(idx))
-                    else:
-                        if distance < distance_threshold:
-                            found_ids.append(int(idx))
-            found_ids = found_ids[:k]
-            
-            if found_ids:
-                placeholders = ','.join('?' * len(found_ids))
-                with sqlite3.connect(self.db_path) as conn:
-                    cursor = conn.cursor()
-                    # Fetch ID and content to preserve FAISS order
-                    cursor.execute(f"SELECT id, content FROM documents WHERE id IN ({placeholders})", found_ids)
-                    id_to_content = {row[0]: row[1] for row in cursor.fetchall()}
-                    for fid in found_ids:
-                        if fid in id_to_content:
-                            content = id_to_content[fid]
-                            results[content] = content
-
-        if len(results) < k:
-            sanitized_query = self._sanitize_query(query)
+        sanitized_query = self._sanitize_query(query)
+        has_vectors = self.index.ntotal > 0 or bool(self._pending_ids)
+        if not has_vectors and not sanitized_query:
+            return []
+
+        candidate_k = k * 3
+        # doc_id -> [vector rank, FTS rank]; a missing rank contributes nothing to the fused score.
+        ranks: Dict[int, List[float]] = {}
+        if has_vectors:
+            query_vec = self._encode_one("検索クエリ: " + query if self.use_prefixes else query)
+            hits = self._search_vectors(query_vec, candidate_k)
+            found_ids = [doc_id for doc_id, distance in hits if self._passes_threshold(distance, distance_threshold)]
+            for rank, doc_id in enumerate(found_ids):
+                ranks[doc_id] = [rank, float('inf')]
+
+        with self._connect() as conn:
+            cursor = conn.cursor()
             if sanitized_query:
-                with sqlite3.connect(self.db_path) as conn:
-                    try:
-                        cursor = conn.cursor()
-                        remaining = k - len(results)
-                        cursor.execute("SELECT content FROM documents_fts WHERE documents_fts MATCH ? ORDER BY rank LIMIT ?", (sanitized_query, remaining))
-                        for row in cursor.fetchall():
-                            if row[0] not in results:
-                                results[row[0]] = row[0]
-                    except Exception:
-                        pass
-        return list(results.values())
+                cursor.execute("SELECT rowid FROM documents_fts WHERE documents_fts MATCH ? ORDER BY rank LIMIT ?", (sanitized_query, candidate_k))
+                for rank, row in enumerate(cursor.fetchall()):
+                    ranks.setdefault(row[0], [float('inf'), float('inf')])[1] = rank
+
+            if not ranks:
+                return []
+
+            # Reciprocal rank fusion; sorted() is stable, so ties keep vector order.
+            fused_ids = sorted(
+                ranks,
+                key=lambda doc_id: sum(1.0 / (RRF_K + r) for r in ranks[doc_id]),
+                reverse=True,
+            )
+            # Binding the ids as one JSON array keeps the SQL text constant for any k,
+            # so the connection's prepared-statement cache is always hit.
+            cursor.execute(
+                "SELECT d.id, d.content FROM documents d JOIN json_each(?) j ON d.id = j.value",
+                (dumps_compact(fused_ids),)
+            )
+            id_to_content = dict(cursor.fetchall())
+        results = dict.fromkeys(id_to_content[doc_id] for doc_id in fused_ids if doc_id in id_to_content)
+        return list(results)[:k]
     
     def clear(self):
         """Clears all documents and resets the FAISS index."""
-        with sqlite3.connect(self.db_path) as conn:
-            try:
-                conn.execute("DELETE FROM documents")
-                # FTS5 table is automatically updated by triggers, 
-                # but it's often better to VACUUM or just let it be.
-            except sqlite3.OperationalError:
-                pass # Table might not exist yet
-
-        if os.path.exists(self.index_path):
-            os.remove(self.index_path)
-        if os.path.exists(self.index_lock_path):
-            try:
-                os.remove(self.index_lock_path)
-            except OSError:
-                pass
-        self._load_or_build_index()
+        with self._pending_lock:
+            self._pending_vectors = []
+            self._pending_ids = []
+            self._pending_removals = set()
+        with self._write() as conn:
+            # The delete trigger keeps documents_fts in sync row by row.
+            conn.execute("DELETE FROM documents")
+        self._embedding_cache.clear()
+
+        # Reset the index in place: no file removal, no re-read of the DB, no re-embedding.
+        with self._index_lock, FileLock(self.index_lock_path):
+            self._create_empty_index()
+            self._persist_index()
+
+    def save_state(self, key: str, value: Any):
+        """Stores a JSON-serializable value under `key` (not part of the LTM, so no data_version bump)."""
+        with self._pool.writer() as conn:
+            conn.execute("INSERT OR REPLACE INTO session_state (key, value) VALUES (?, ?)", (key, dumps_compact(value)))
+
+    def load_state(self, key: str, default: Any = None) -> Any:
+        """Returns the value stored by save_state(), or `default`."""
+        row = self._connect().execute("SELECT value FROM session_state WHERE key = ?", (key,)).fetchone()
+        return parse_llm_json(row[0]) if row else default
+
+    def find_by_entity(self, entity: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Returns documents whose entity list contains `entity` exactly, newest first.
+
+        Matching runs inside SQLite via JSON1's json_each, so no rows are
+        parsed in Python.
+        """
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
+            cursor.execute(
+                "SELECT id, content, entities, problem_class, timestamp FROM documents "
+                "WHERE EXISTS (SELECT 1 FROM json_each(documents.entities) WHERE json_each.value = ?) "
+                "ORDER BY id DESC LIMIT ?",
+                (entity, limit)
+            )
+            return [dict(row) for row in cursor.fetchall()]
+
+    def find_by_problem_class(self, problem_class: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Returns documents in the given problem class, newest first."""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
+            cursor.execute(
+                "SELECT id, content, entities, problem_class, timestamp FROM documents "
+                "WHERE problem_class = ? ORDER BY id DESC LIMIT ?",
+                (problem_class, limit)
+            )
+            return [dict(row) for row in cursor.fetchall()]
 
     def get_all(self) -> List[Dict[str, Any]]:
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self._connect() as conn:
             cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
             cursor.execute("SELECT id, content, entities, problem_class, timestamp FROM documents ORDER BY id DESC")
             return [dict(row) for row in cursor.fetchall()]
+
+    def get_all_columnar(self, limit: int = -1) -> Dict[str, list]:
+        """Same rows as get_all() (newest `limit` if given), as {column: values} for DataFrames."""
+        cursor = self._connect().execute(
+            "SELECT id, content, entities, problem_class, timestamp FROM documents ORDER BY id DESC LIMIT ?",
+            (limit,)
+        )
+        return columnar(cursor)
+
+    def count(self) -> int:
+        """Returns the number of stored documents."""
+        return self._connect().execute("SELECT COUNT(*) FROM documents").fetchone()[0]
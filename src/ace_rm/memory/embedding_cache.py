@@ -0,0 +1,78 @@
+"""
+Content-addressed cache for text embeddings.
+An in-process LRU sits in front of an `embedding_cache` SQLite table, so
+repeated texts skip the transformer both within and across processes.
+Only document embeddings are written to the table; queries stay in memory.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from ace_rm.utils.db_manager import ConnectionPool
+
+
+class EmbeddingCache:
+    """Two-level (memory LRU + SQLite) cache of float32 embeddings keyed by text hash.
+
+    The key also covers the model name and normalization setting, so a
+    model switch never returns stale vectors.
+    """
+
+    def __init__(self, pool: ConnectionPool, namespace: str, maxsize: int = 4096, max_rows: int = 50000):
+        self._pool = pool
+        self._namespace = namespace.encode()
+        self._maxsize = maxsize
+        self._max_rows = max_rows
+        self._lru: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        with self._pool.writer() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS embedding_cache (hash BLOB PRIMARY KEY, vec BLOB)")
+
+    def _key(self, text: str) -> bytes:
+        return hashlib.sha1(self._namespace + b"\0" + text.encode()).digest()
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        """Returns the cached (read-only) vector for `text`, or None."""
+        key = self._key(text)
+        with self._lock:
+            vec = self._lru.get(key)
+            if vec is not None:
+                self._lru.move_to_end(key)
+                return vec
+        row = self._pool.reader().execute("SELECT vec FROM embedding_cache WHERE hash = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        vec = np.frombuffer(row[0], dtype=np.float32)
+        self._remember(key, vec)
+        return vec
+
+    def put(self, text: str, vec: np.ndarray, persist: bool = False):
+        """Stores a 1-D float32 vector for `text`; with `persist`, in SQLite as well."""
+        key = self._key(text)
+        vec = np.ascontiguousarray(vec, dtype=np.float32)
+        if persist:
+            with self._pool.writer() as conn:
+                conn.execute("INSERT OR IGNORE INTO embedding_cache (hash, vec) VALUES (?, ?)", (key, vec.tobytes()))
+                # Rowids grow with each insert, so this keeps the newest max_rows entries.
+                conn.execute(
+                    "DELETE FROM embedding_cache WHERE rowid <= (SELECT MAX(rowid) FROM embedding_cache) - ?",
+                    (self._max_rows,)
+                )
+        self._remember(key, vec)
+
+    def clear(self):
+        """Drops every cached vector, in memory and in SQLite."""
+        with self._lock:
+            self._lru.clear()
+        with self._pool.writer() as conn:
+            conn.execute("DELETE FROM embedding_cache")
+
+    def _remember(self, key: bytes, vec: np.ndarray):
+        with self._lock:
+            self._lru[key] = vec
+            self._lru.move_to_end(key)
+            while len(self._lru) > self._maxsize:
+                self._lru.popitem(last=False)
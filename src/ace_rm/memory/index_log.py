@@ -0,0 +1,82 @@
+"""
+Append-only change log for the FAISS index file.
+Each ACE_Memory flush appends one block (removed ids, added ids and their
+vectors) instead of rewriting the whole index; the log is folded back into
+the index file ("compaction") once it grows past a size limit.
+
+Block layout: uint32 n_removed, uint32 n_added, int64[n_removed] removed ids,
+int64[n_added] added ids, float32[n_added * d] vectors (little endian).
+"""
+import os
+import struct
+from typing import Iterator, Tuple
+
+import numpy as np
+
+_HEADER = struct.Struct("<II")
+
+
+def append_block(path: str, offset: int, removed: np.ndarray, ids: np.ndarray, vectors: np.ndarray) -> int:
+    """Writes one block at `offset` and fsyncs it.
+
+    Anything after `offset` (a block torn by a crash mid-append) is discarded first.
+
+    Returns:
+        The log size after the append.
+    """
+    payload = b"".join((
+        _HEADER.pack(len(removed), len(ids)),
+        np.ascontiguousarray(removed, dtype="<i8").tobytes(),
+        np.ascontiguousarray(ids, dtype="<i8").tobytes(),
+        np.ascontiguousarray(vectors, dtype="<f4").tobytes(),
+    ))
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        os.ftruncate(fd, offset)
+        os.lseek(fd, offset, os.SEEK_SET)
+        os.write(fd, payload)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    return offset + len(payload)
+
+
+def read_blocks(path: str, dimension: int, offset: int = 0) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray, int]]:
+    """Yields (removed_ids, added_ids, vectors, end_offset) for each complete block after `offset`.
+
+    A truncated trailing block is ignored.
+    """
+    try:
+        with open(path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+    except FileNotFoundError:
+        return
+    pos = 0
+    while pos + _HEADER.size <= len(data):
+        n_removed, n_added = _HEADER.unpack_from(data, pos)
+        start = pos + _HEADER.size
+        end = start + 8 * (n_removed + n_added) + 4 * dimension * n_added
+        if end > len(data):
+            break
+        removed = np.frombuffer(data, dtype="<i8", count=n_removed, offset=start)
+        ids = np.frombuffer(data, dtype="<i8", count=n_added, offset=start + 8 * n_removed)
+        vectors = np.frombuffer(
+            data, dtype="<f4", count=n_added * dimension, offset=start + 8 * (n_removed + n_added)
+        ).reshape(n_added, dimension)
+        pos = end
+        yield removed, ids, vectors, offset + pos
+
+
+def log_size(path: str) -> int:
+    """Returns the log size in bytes (0 if it does not exist)."""
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def truncate(path: str):
+    """Empties the log after its contents were folded into the index file."""
+    if os.path.exists(path):
+        os.truncate(path, 0)
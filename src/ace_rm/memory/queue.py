@@ -1,8 +1,30 @@
+import hashlib
 import os
 import sqlite3
-from typing import List, Optional, Dict, Any
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Dict, Any, Tuple
 
-from ace_rm.config import DB_PATH
+from ace_rm.config import ANALYSIS_CACHE_TTL_HOURS, DB_PATH, ENQUEUE_DEDUP_WINDOW
+from ace_rm.utils.db_manager import ConnectionPool, columnar
+from ace_rm.utils.json_utils import dumps_compact, parse_llm_json
+
+# One wake event per database file, so a worker is signalled by enqueues
+# from any TaskQueue instance in this process that targets the same file.
+_WAKE_EVENTS: Dict[str, threading.Event] = {}
+_WAKE_EVENTS_LOCK = threading.Lock()
+
+
+def _cache_age() -> str:
+    """SQLite datetime modifier for the oldest analysis still served from reflector_cache."""
+    return f"-{ANALYSIS_CACHE_TTL_HOURS * 3600:.0f} seconds"
+
+
+def _wake_event_for(db_path: str) -> threading.Event:
+    key = os.path.abspath(db_path)
+    with _WAKE_EVENTS_LOCK:
+        return _WAKE_EVENTS.setdefault(key, threading.Event())
 
 class TaskQueue:
     """Manages the background task queue for structural learning.
@@ -20,11 +42,40 @@ class TaskQueue:
         else:
             self.db_path = DB_PATH
         
+        self._pool = ConnectionPool(self.db_path)
+        # Incremented after every committed write through this instance, so
+        # views can tell cheaply whether anything changed since they last read.
+        self.data_version = 0
+        # Set on enqueue so an idle worker wakes immediately instead of polling.
+        self._wake = _wake_event_for(self.db_path)
+        # (sha256 of the last enqueued pair, monotonic time), for ENQUEUE_DEDUP_WINDOW.
+        self._last_enqueued: Optional[Tuple[bytes, float]] = None
+        self._enqueue_lock = threading.Lock()
         self._init_db()
 
+    def _connect(self) -> sqlite3.Connection:
+        """Returns the calling thread's persistent read connection."""
+        return self._pool.reader()
+
+    @contextmanager
+    def _write(self) -> Iterator[sqlite3.Connection]:
+        """Context manager yielding the serialized write connection; bumps data_version on commit.
+
+        Transactions that changed no rows (e.g. an idle worker's empty claim) leave it as is.
+        """
+        with self._pool.writer() as conn:
+            changes = conn.total_changes
+            yield conn
+            changed = conn.total_changes != changes
+        if changed:
+            self.data_version += 1
+
+    def close(self):
+        """Closes the pooled SQLite connections owned by this thread."""
+        self._pool.close()
+
     def _init_db(self):
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("PRAGMA journal_mode=WAL;")
+        with self._write() as conn:
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS task_queue (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -37,46 +88,170 @@ class TaskQueue:
                     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
                 )
             """)
-
-    def enqueue_task(self, user_input: str, agent_output: str):
-        self._init_db()
-        with sqlite3.connect(self.db_path) as conn:
+            # Only pending rows are indexed, so claiming work never walks the finished history.
             conn.execute(
-                "INSERT INTO task_queue (user_input, agent_output) VALUES (?, ?)",
-                (user_input, agent_output)
+                "CREATE INDEX IF NOT EXISTS idx_task_queue_pending ON task_queue(id) WHERE status = 'pending'"
             )
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS reflector_cache (
+                    h BLOB PRIMARY KEY,
+                    payload TEXT,
+                    ts DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_reflector_cache_ts ON reflector_cache(ts)")
+
+    def enqueue_task(self, user_input: str, agent_output: str) -> bool:
+        """Queues an interaction for reflection.
+
+        Returns:
+            False if it repeats the previous enqueue within ENQUEUE_DEDUP_WINDOW
+            seconds and was dropped, True otherwise.
+        """
+        key = hashlib.sha256(f"{user_input}\x00{agent_output}".encode()).digest()
+        now = time.monotonic()
+        # Held through the INSERT so a concurrent double submit cannot slip past the check,
+        # and recorded only once the row is written so a failed insert can be retried.
+        with self._enqueue_lock:
+            last = self._last_enqueued
+            if last is not None and last[0] == key and now - last[1] < ENQUEUE_DEDUP_WINDOW:
+                return False
+            with self._write() as conn:
+                conn.execute(
+                    "INSERT INTO task_queue (user_input, agent_output) VALUES (?, ?)",
+                    (user_input, agent_output)
+                )
+            self._last_enqueued = (key, now)
+        self._wake.set()
+        return True
+
+    def wait_for_task(self, timeout: Optional[float] = None) -> bool:
+        """Blocks until a task is enqueued in this process or the timeout elapses.
+
+        Returns:
+            True if woken by an enqueue, False on timeout.
+        """
+        woken = self._wake.wait(timeout)
+        self._wake.clear()
+        return woken
+
+    def notify(self):
+        """Wakes any thread blocked in wait_for_task()."""
+        self._wake.set()
+
+    def use_wake_event(self, event: threading.Event):
+        """Signals `event` on enqueue instead of the per-file default.
+
+        Lets one worker wait on a single event for several queues. Later
+        TaskQueue instances for the same file pick up the event too.
+        """
+        self._wake = event
+        with _WAKE_EVENTS_LOCK:
+            _WAKE_EVENTS[os.path.abspath(self.db_path)] = event
 
     def fetch_pending_task(self) -> Optional[Dict[str, Any]]:
-        self._init_db()
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self._connect() as conn:
             cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
             cursor.execute("SELECT * FROM task_queue WHERE status = 'pending' ORDER BY id ASC LIMIT 1")
             row = cursor.fetchone()
             if row:
                 return dict(row)
         return None
 
+    def fetch_pending_tasks(self, limit: int) -> List[Dict[str, Any]]:
+        """Returns up to `limit` pending tasks, oldest first."""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
+            cursor.execute("SELECT * FROM task_queue WHERE status = 'pending' ORDER BY id ASC LIMIT ?", (limit,))
+            return [dict(row) for row in cursor.fetchall()]
+
+    def claim_pending_tasks(self, limit: int) -> List[Dict[str, Any]]:
+        """Atomically marks up to `limit` pending tasks as processing and returns them.
+
+        The select and the status change are a single UPDATE ... RETURNING
+        statement, so two workers polling the same database never claim
+        the same task.
+        """
+        with self._write() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
+            cursor.execute(
+                """
+                UPDATE task_queue SET status = 'processing', updated_at = CURRENT_TIMESTAMP
+                WHERE id IN (SELECT id FROM task_queue WHERE status = 'pending' ORDER BY id ASC LIMIT ?)
+                RETURNING *
+                """,
+                (limit,)
+            )
+            tasks = [dict(row) for row in cursor.fetchall()]
+        # RETURNING yields rows in no particular order.
+        return sorted(tasks, key=lambda t: t['id'])
+
     def mark_task_processing(self, task_id: int):
-        with sqlite3.connect(self.db_path) as conn:
+        with self._write() as conn:
             conn.execute("UPDATE task_queue SET status = 'processing', updated_at = CURRENT_TIMESTAMP WHERE id = ?", (task_id,))
 
     def mark_task_complete(self, task_id: int):
-        with sqlite3.connect(self.db_path) as conn:
+        with self._write() as conn:
             conn.execute("UPDATE task_queue SET status = 'done', updated_at = CURRENT_TIMESTAMP WHERE id = ?", (task_id,))
     
+    def mark_tasks_complete(self, task_ids: List[int]):
+        """Marks several tasks done in a single transaction."""
+        with self._write() as conn:
+            conn.executemany(
+                "UPDATE task_queue SET status = 'done', updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                [(task_id,) for task_id in task_ids]
+            )
+
     def mark_task_failed(self, task_id: int, error_msg: str):
-        with sqlite3.connect(self.db_path) as conn:
+        with self._write() as conn:
             conn.execute("UPDATE task_queue SET status = 'failed', error_msg = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?", (error_msg, task_id))
 
+    def get_cached_analysis(self, prompt: str) -> Optional[Dict[str, Any]]:
+        """Returns the stored analysis result for an identical reflection or Curator prompt, or None."""
+        h = hashlib.sha256(prompt.encode()).digest()
+        row = self._connect().execute(
+            "SELECT payload FROM reflector_cache WHERE h = ? AND ts >= datetime('now', ?)", (h, _cache_age())
+        ).fetchone()
+        return parse_llm_json(row[0]) if row else None
+
+    def cache_analysis(self, prompt: str, data: Dict[str, Any]):
+        """Stores the parsed analysis result for a reflection or Curator prompt, dropping expired ones."""
+        h = hashlib.sha256(prompt.encode()).digest()
+        # Not through _write(): the cache is not shown in the UI, so it is no data_version change.
+        with self._pool.writer() as conn:
+            conn.execute("DELETE FROM reflector_cache WHERE ts < datetime('now', ?)", (_cache_age(),))
+            conn.execute(
+                "INSERT OR REPLACE INTO reflector_cache (h, payload, ts) VALUES (?, ?, CURRENT_TIMESTAMP)",
+                (h, dumps_compact(data))
+            )
+
     def get_tasks(self) -> List[Dict[str, Any]]:
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self._connect() as conn:
             cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
             cursor.execute("SELECT id, user_input, status, created_at, updated_at, error_msg FROM task_queue ORDER BY id DESC LIMIT 20")
             return [dict(row) for row in cursor.fetchall()]
 
+    def get_tasks_columnar(self) -> Dict[str, list]:
+        """Same rows as get_tasks(), as {column: values} (cheaper to turn into a DataFrame)."""
+        cursor = self._connect().execute(
+            "SELECT id, user_input, status, created_at, updated_at, error_msg FROM task_queue ORDER BY id DESC LIMIT 20"
+        )
+        return columnar(cursor)
+
+    def get_status_summary(self, window: int = 20) -> Dict[str, int]:
+        """Returns {status: count} over the latest `window` tasks (the rows get_tasks() shows)."""
+        rows = self._connect().execute(
+            "SELECT status, COUNT(*) FROM (SELECT status FROM task_queue ORDER BY id DESC LIMIT ?) GROUP BY status",
+            (window,)
+        ).fetchall()
+        return dict(rows)
+
     def clear(self):
         """Note: This is usually handled by memory.clear() if they share the same DB file."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._write() as conn:
             conn.execute("DELETE FROM task_queue")
+            conn.execute("DELETE FROM reflector_cache")
@@ -0,0 +1,285 @@
+"""
+FAISS index construction helpers for ACE_Memory.
+Keeps index-type specific details (HNSW parameters, id removal and
+tombstones) out of the memory class itself.
+"""
+import os
+from typing import Iterable, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from ace_rm.config import (
+    FAISS_AUTO_HNSW_MIN_SIZE, HNSW_COMPACT_RATIO, HNSW_EF_CONSTRUCTION, HNSW_EF_SEARCH, HNSW_M,
+    IVFPQ_NLIST, IVFPQ_NPROBE, IVFPQ_MIN_TRAIN_SIZE, SQ8_MIN_TRAIN_SIZE
+)
+
+# Sub-quantizer counts tried for IVFPQ, largest first (each code is M bytes).
+_PQ_M_CANDIDATES = (64, 48, 32, 16, 8)
+
+
+def _faiss_metric(distance_metric: str) -> int:
+    return faiss.METRIC_INNER_PRODUCT if distance_metric == 'cosine' else faiss.METRIC_L2
+
+
+def create_index(dimension: int, distance_metric: str, index_type: str) -> faiss.Index:
+    """Creates an empty ID-mapped FAISS index.
+
+    Args:
+        dimension: The embedding dimension.
+        distance_metric: 'cosine' (inner product) or 'l2'.
+        index_type: 'hnsw' for a graph index, anything else for exact flat search.
+            'ivfpq', 'hnsw_sq8' and 'auto' also start flat and are converted
+            once large enough; see `maybe_upgrade_index`.
+
+    Returns:
+        An `IndexIDMap2` wrapping the requested index.
+    """
+    metric = _faiss_metric(distance_metric)
+    if index_type == 'hnsw':
+        base = _hnsw(dimension, metric)
+    elif metric == faiss.METRIC_INNER_PRODUCT:
+        base = faiss.IndexFlatIP(dimension)
+    else:
+        base = faiss.IndexFlatL2(dimension)
+    return faiss.IndexIDMap2(base)
+
+
+def _hnsw(dimension: int, metric: int, sq8: bool = False) -> faiss.IndexHNSW:
+    if sq8:
+        base = faiss.IndexHNSWSQ(dimension, faiss.ScalarQuantizer.QT_8bit, HNSW_M, metric)
+    else:
+        base = faiss.IndexHNSWFlat(dimension, HNSW_M, metric)
+    base.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    base.hnsw.efSearch = HNSW_EF_SEARCH
+    return base
+
+
+def configure_index(index: faiss.Index) -> faiss.Index:
+    """Applies search-time parameters to an index loaded from disk."""
+    base = faiss.downcast_index(index.index) if hasattr(index, "index") else index
+    if isinstance(base, faiss.IndexHNSW):
+        base.hnsw.efSearch = HNSW_EF_SEARCH
+    elif isinstance(base, faiss.IndexIVF):
+        base.nprobe = IVFPQ_NPROBE
+    return index
+
+
+def upgrade_due(index: faiss.Index, index_type: str) -> bool:
+    """Returns True if `maybe_upgrade_index` would convert this index."""
+    min_size = {
+        'ivfpq': IVFPQ_MIN_TRAIN_SIZE, 'hnsw_sq8': SQ8_MIN_TRAIN_SIZE, 'auto': FAISS_AUTO_HNSW_MIN_SIZE
+    }.get(index_type)
+    if min_size is None or index.ntotal < min_size:
+        return False
+    return isinstance(faiss.downcast_index(index.index), faiss.IndexFlat)
+
+
+def maybe_upgrade_index(index: faiss.Index, index_type: str) -> faiss.Index:
+    """Converts a flat index once it has grown past the size for `index_type`.
+
+    'ivfpq': to IVFPQ once there are enough vectors to train on. Product
+    quantization stores each vector in M bytes instead of 4*d, at a small
+    recall cost.
+    'hnsw_sq8': to HNSW over 8-bit scalar-quantized vectors, whose per-dimension
+    ranges are trained on the vectors collected so far.
+    'auto': to HNSW once exact search is slow enough to matter.
+
+    Returns:
+        The (possibly new) index holding the same ids and vectors.
+    """
+    if not upgrade_due(index, index_type):
+        return index
+
+    base = faiss.downcast_index(index.index)
+    vectors = base.reconstruct_n(0, base.ntotal)
+    ids = faiss.vector_to_array(index.id_map)
+    if index_type in ('auto', 'hnsw_sq8'):
+        hnsw = _hnsw(base.d, base.metric_type, sq8=index_type == 'hnsw_sq8')
+        hnsw.train(vectors)
+        upgraded = faiss.IndexIDMap2(hnsw)
+        upgraded.add_with_ids(vectors, ids)
+        return upgraded
+
+    d = base.d
+    m = next((m for m in _PQ_M_CANDIDATES if d % m == 0), 1)
+    # ~39 training points per centroid keeps k-means well conditioned.
+    nlist = max(1, min(IVFPQ_NLIST, index.ntotal // 39))
+    quantizer = faiss.IndexFlatIP(d) if base.metric_type == faiss.METRIC_INNER_PRODUCT else faiss.IndexFlatL2(d)
+    ivfpq = faiss.IndexIVFPQ(quantizer, d, nlist, m, 8, base.metric_type)
+    # 256 codewords per sub-quantizer train fine on a few thousand vectors;
+    # silence FAISS's 39-points-per-centroid warning for them.
+    ivfpq.pq.cp.min_points_per_centroid = 1
+
+    ivfpq.train(vectors)
+    ivfpq.nprobe = IVFPQ_NPROBE
+    upgraded = faiss.IndexIDMap2(ivfpq)
+    upgraded.add_with_ids(vectors, ids)
+    return upgraded
+
+
+def read_index(path: str, mmap: bool = False) -> faiss.Index:
+    """Reads an index from disk.
+
+    With `mmap`, vector storage is memory-mapped read-only instead of copied
+    into RSS, so processes opening the same file share the OS page cache.
+    Such an index can be searched but not modified.
+    """
+    flags = faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY if mmap else 0
+    return configure_index(faiss.read_index(path, flags))
+
+
+def write_index(index: faiss.Index, path: str):
+    """Writes an index atomically.
+
+    The file is replaced rather than rewritten in place, so readers that
+    memory-mapped the previous version keep a valid mapping.
+    """
+    tmp_path = f"{path}.tmp"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _live_mask(index: faiss.Index) -> np.ndarray:
+    """Marks the positions holding each id's current vector.
+
+    HNSW graphs cannot delete, so a replaced vector stays in the graph and the
+    replacement is appended under the same id: only the last position added
+    for an id is live, the earlier ones are tombstones.
+    """
+    ids = faiss.vector_to_array(index.id_map)
+    live = np.ones(len(ids), dtype=bool)
+    if isinstance(faiss.downcast_index(index.index), faiss.IndexHNSW) and len(ids):
+        _, last_reversed = np.unique(ids[::-1], return_index=True)
+        live[:] = False
+        live[len(ids) - 1 - last_reversed] = True
+    return live
+
+
+class Tombstones:
+    """Searches an ID-mapped index while skipping its tombstoned positions.
+
+    Built for one state of one index; `is_current` tells whether it still applies
+    (indexes only grow between rebuilds, so `ntotal` identifies the state).
+    """
+
+    def __init__(self, index: faiss.Index):
+        self.index = index
+        self.ntotal = index.ntotal
+        live = _live_mask(index)
+        self.count = int(len(live) - live.sum())
+        self._params = None
+        if self.count:
+            base = faiss.downcast_index(index.index)
+            self._ids = faiss.vector_to_array(index.id_map)
+            # IDSelectorNot only points at the batch selector, so keep both alive.
+            self._dead = faiss.IDSelectorBatch(np.flatnonzero(~live).astype(np.int64))
+            self._selector = faiss.IDSelectorNot(self._dead)
+            self._params = faiss.SearchParametersHNSW(sel=self._selector, efSearch=base.hnsw.efSearch)
+
+    def is_current(self, index: faiss.Index) -> bool:
+        return index is self.index and index.ntotal == self.ntotal
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Like `index.search`, returning (distances, ids) of live vectors only."""
+        if self._params is None:
+            return self.index.search(query, k)
+        distances, positions = faiss.downcast_index(self.index.index).search(query, k, params=self._params)
+        return distances, np.where(positions >= 0, self._ids[positions], -1)
+
+
+def _rebuild(index: faiss.Index, keep: np.ndarray) -> faiss.Index:
+    """Returns a fresh HNSW index of the same kind holding the positions in `keep`."""
+    base = faiss.downcast_index(index.index)
+    all_ids = faiss.vector_to_array(index.id_map)
+    vectors = base.reconstruct_n(0, base.ntotal)[keep]
+
+    if isinstance(base, faiss.IndexHNSWSQ):
+        rebuilt_base = faiss.IndexHNSWSQ(base.d, faiss.ScalarQuantizer.QT_8bit, base.hnsw.nb_neighbors(1), base.metric_type)
+        # Keep the trained value ranges; the remaining vectors may be too few to retrain on.
+        storage = faiss.downcast_index(rebuilt_base.storage)
+        storage.sq.trained = faiss.downcast_index(base.storage).sq.trained
+        storage.is_trained = rebuilt_base.is_trained = True
+    else:
+        rebuilt_base = faiss.IndexHNSWFlat(base.d, base.hnsw.nb_neighbors(1), base.metric_type)
+    rebuilt_base.hnsw.efConstruction = base.hnsw.efConstruction
+    rebuilt_base.hnsw.efSearch = base.hnsw.efSearch
+    rebuilt = faiss.IndexIDMap2(rebuilt_base)
+    if len(vectors):
+        rebuilt.add_with_ids(vectors, all_ids[keep])
+    return rebuilt
+
+
+def remove_ids(index: faiss.Index, ids: Iterable[int]) -> faiss.Index:
+    """Removes vectors by id, rebuilding the index if it cannot delete in place.
+
+    HNSW graphs do not support deletion, so the remaining vectors are
+    reconstructed and re-inserted into a fresh index of the same type.
+    Prefer `replace_vectors`, which avoids the rebuild for replaced ids.
+
+    Returns:
+        The index holding the remaining vectors (may be a new object).
+    """
+    id_array = np.asarray(list(ids), dtype=np.int64)
+    if not isinstance(faiss.downcast_index(index.index), faiss.IndexHNSW):
+        index.remove_ids(id_array)
+        return index
+    keep = _live_mask(index) & ~np.isin(faiss.vector_to_array(index.id_map), id_array)
+    return _rebuild(index, keep)
+
+
+def replace_vectors(index: faiss.Index, removed: np.ndarray, ids: np.ndarray, vectors: np.ndarray) -> faiss.Index:
+    """Removes the ids in `removed`, then adds `vectors` under `ids`.
+
+    On HNSW, ids that are re-added are not deleted: their old vectors become
+    tombstones (see `Tombstones`), reclaimed later by `maybe_compact_index`.
+
+    Returns:
+        The updated index (a new object if a rebuild was needed).
+    """
+    hnsw = isinstance(faiss.downcast_index(index.index), faiss.IndexHNSW)
+    if len(removed) and not (hnsw and np.isin(removed, ids).all()):
+        index = remove_ids(index, removed)
+    if len(ids):
+        index.add_with_ids(vectors, ids)
+    return index
+
+
+def maybe_compact_index(index: faiss.Index) -> faiss.Index:
+    """Rebuilds an HNSW index without its tombstones once they exceed HNSW_COMPACT_RATIO."""
+    if not isinstance(faiss.downcast_index(index.index), faiss.IndexHNSW) or index.ntotal == 0:
+        return index
+    live = _live_mask(index)
+    if 1.0 - live.sum() / len(live) <= HNSW_COMPACT_RATIO:
+        return index
+    return _rebuild(index, live)
+
+
+def matches_index_type(index: faiss.Index, index_type: str) -> bool:
+    """True if `index` is what `index_type` builds (flat counts for types that upgrade later)."""
+    base = faiss.downcast_index(index.index)
+    if isinstance(base, faiss.IndexHNSWSQ):
+        return index_type == 'hnsw_sq8'
+    if isinstance(base, faiss.IndexHNSW):
+        return index_type in ('hnsw', 'auto')
+    if isinstance(base, faiss.IndexIVF):
+        return index_type == 'ivfpq'
+    return index_type != 'hnsw'
+
+
+def convert_index(index: faiss.Index, distance_metric: str, index_type: str) -> Optional[faiss.Index]:
+    """Rebuilds `index` as `index_type` from its stored vectors.
+
+    Returns:
+        The converted index, or None if the stored vectors are quantized
+        (lossy), in which case the documents should be re-embedded instead.
+    """
+    base = faiss.downcast_index(index.index)
+    if not isinstance(base, (faiss.IndexFlat, faiss.IndexHNSWFlat)):
+        return None
+    live = _live_mask(index)
+    converted = create_index(base.d, distance_metric, index_type)
+    if live.any():
+        vectors = base.reconstruct_n(0, base.ntotal)[live]
+        converted.add_with_ids(vectors, faiss.vector_to_array(index.id_map)[live])
+    return maybe_upgrade_index(converted, index_type)
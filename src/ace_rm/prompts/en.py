@@ -76,6 +76,23 @@ Output JSON only:
 }}
 """
 
+FUSED_CURATOR_PROMPT = """
+Analyze the user's latest request and draft an answer to it in a single step.
+
+User Request: "{user_input}"
+Current Model: {current_model}
+History: 
+{history_txt}
+
+{session_info}
+
+1. Extract the specific entities and facts mentioned in the request.
+2. Identify the abstract problem class or general principle behind it.
+3. Write one effective search query combining the entities and abstract concepts.
+4. List MFR diff operations (ADD_CONSTRAINT / MODIFY_ACTION / DROP_ENTITY) if the request changes the Current Model, otherwise an empty list.
+5. Draft the final answer to the user. It is sent as-is when the memory holds nothing relevant, so make it complete.
+"""
+
 RETRIEVED_CONTEXT_TEMPLATE = "--- Retrieved Context ---\n{context_str}\n-----------------------"
 
 # --- STM (Short-Term Memory) Templates ---
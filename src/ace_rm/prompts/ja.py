@@ -90,6 +90,24 @@ INTENT_ANALYSIS_PROMPT = """
 }}
 """
 
+FUSED_CURATOR_PROMPT = """
+ユーザーの最新の入力を分析し、同時にその回答の下書きを作成してください。
+出力（draft_answer）は必ず日本語（Japanese）で行ってください。
+
+ユーザーの入力: "{user_input}"
+現在の世界モデル: {current_model}
+履歴: 
+{history_txt}
+
+{session_info}
+
+1. 入力に含まれる具体的なエンティティや事実を抽出。
+2. 関連する抽象的な問題クラスや意図を特定。
+3. エンティティと抽象概念を組み合わせた検索クエリを1つ作成。
+4. 入力が現在の世界モデルを変更する場合は差分操作（ADD_CONSTRAINT / MODIFY_ACTION / DROP_ENTITY）を列挙し、変更がなければ空リスト。
+5. ユーザーへの最終回答の下書きを作成。記憶に関連情報がない場合はそのまま送信されるため、完結した回答にしてください。
+"""
+
 RETRIEVED_CONTEXT_TEMPLATE = "--- 取得されたコンテキスト ---\n{context_str}\n-----------------------"
 
 # --- STM (Short-Term Memory) Templates ---
@@ -1,4 +1,12 @@
 """Utils module for ACE-RM."""
-from ace_rm.utils.embedding_manager import get_embedding_model
 
-__all__ = ["get_embedding_model"]
+__all__ = ["get_embedding_model", "get_encode_batcher"]
+
+
+def __getattr__(name):
+    # Resolved on first access so importing a light helper (e.g. ace_rm.utils.json_utils)
+    # does not load sentence-transformers and torch.
+    if name in __all__:
+        from ace_rm.utils import embedding_manager
+        return getattr(embedding_manager, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
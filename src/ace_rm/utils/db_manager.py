@@ -0,0 +1,84 @@
+"""
+Shared SQLite connection helpers.
+Applies the same PRAGMA tuning to every connection opened by
+ACE_Memory and TaskQueue so the UI thread and the BackgroundWorker
+do not block each other on the same database file.
+"""
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+BUSY_TIMEOUT_SECONDS = 5.0
+
+CONNECTION_PRAGMAS = """
+PRAGMA journal_mode=WAL;
+PRAGMA synchronous=NORMAL;
+PRAGMA busy_timeout=5000;
+PRAGMA temp_store=MEMORY;
+PRAGMA cache_size=-20000;
+PRAGMA mmap_size=268435456;
+"""
+
+
+def connect(db_path: str) -> sqlite3.Connection:
+    """
+    Opens a SQLite connection with WAL journaling, relaxed fsync
+    (synchronous=NORMAL is durable under WAL), a busy timeout and
+    memory-mapped reads of the first 256 MiB of the database file.
+    """
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_SECONDS, check_same_thread=False)
+    conn.executescript(CONNECTION_PRAGMAS)
+    return conn
+
+
+class ConnectionPool:
+    """Long-lived connections for a single database file.
+
+    Each thread gets its own reader connection (kept in thread-local
+    storage, so its page cache and statement cache survive across calls),
+    while all writes go through one dedicated connection serialized by a lock.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._writer: Optional[sqlite3.Connection] = None
+
+    def reader(self) -> sqlite3.Connection:
+        """Returns the calling thread's read connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect(self.db_path)
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """Yields the shared write connection inside a transaction."""
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = connect(self.db_path)
+            with self._writer:
+                yield self._writer
+
+    def close(self):
+        """Closes the writer and the calling thread's reader connection."""
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def columnar(cursor: sqlite3.Cursor) -> Dict[str, list]:
+    """Fetches a cursor's result as {column name: list of values}."""
+    names = [d[0] for d in cursor.description]
+    rows = cursor.fetchall()
+    if not rows:
+        return {name: [] for name in names}
+    return {name: list(values) for name, values in zip(names, zip(*rows))}
@@ -3,17 +3,26 @@ Shared embedding model manager.
 Provides a singleton-like access to the SentenceTransformer model
 to avoid redundant model loading across components.
 """
+import os
 import threading
-from typing import Optional
-from sentence_transformers import SentenceTransformer
+from typing import TYPE_CHECKING, Optional
 
-from ace_rm.config import EMBEDDING_MODEL_NAME, ACE_DEVICE
+from ace_rm.config import (
+    EMBEDDING_MODEL_NAME, ACE_DEVICE, EMBEDDING_BACKEND, EMBEDDING_ONNX_FILE, EMBEDDING_MAX_SEQ_LENGTH,
+    EMBEDDING_QUANTIZATION, EMBEDDING_EXPORT_DIR, ENCODE_BATCH_MAX_SIZE, ENCODE_BATCH_WAIT_MS
+)
+from ace_rm.utils.encode_batcher import EncodeBatcher
 
-_model: Optional[SentenceTransformer] = None
+if TYPE_CHECKING:
+    # Imported when the model is first loaded; sentence-transformers pulls in torch.
+    from sentence_transformers import SentenceTransformer
+
+_model: Optional["SentenceTransformer"] = None
+_batcher: Optional[EncodeBatcher] = None
 _lock = threading.Lock()
 
 
-def get_embedding_model() -> SentenceTransformer:
+def get_embedding_model() -> "SentenceTransformer":
     """
     Returns the shared SentenceTransformer model instance.
     Thread-safe initialization ensures the model is loaded only once.
@@ -23,5 +32,72 @@ def get_embedding_model() -> SentenceTransformer:
         with _lock:
             # Double-check locking pattern
             if _model is None:
-                _model = SentenceTransformer(EMBEDDING_MODEL_NAME, device=ACE_DEVICE)
+                model = _load_model()
+                if EMBEDDING_MAX_SEQ_LENGTH:
+                    model.max_seq_length = EMBEDDING_MAX_SEQ_LENGTH
+                _model = model
     return _model
+
+
+def get_encode_batcher() -> EncodeBatcher:
+    """
+    Returns the shared micro-batcher in front of the shared model, so
+    concurrent single-text encodes from all components share forward passes.
+    """
+    global _batcher
+    if _batcher is None:
+        model = get_embedding_model()
+        with _lock:
+            if _batcher is None:
+                def encode(texts, normalize):
+                    return model.encode(
+                        texts,
+                        batch_size=ENCODE_BATCH_MAX_SIZE,
+                        show_progress_bar=False,
+                        convert_to_numpy=True,
+                        normalize_embeddings=normalize,
+                    )
+                _batcher = EncodeBatcher(encode, ENCODE_BATCH_MAX_SIZE, ENCODE_BATCH_WAIT_MS)
+    return _batcher
+
+
+def _load_model() -> "SentenceTransformer":
+    """Loads the model on the configured inference backend.
+
+    The "onnx" backend requires `sentence-transformers[onnx]`; models without an
+    ONNX export in their repository are exported on first load.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    if EMBEDDING_BACKEND == "torch":
+        model = SentenceTransformer(EMBEDDING_MODEL_NAME, device=ACE_DEVICE)
+        if model.device.type == "cuda":
+            # Half-precision weights halve memory traffic on GPU at no practical recall cost.
+            model.half()
+        return model
+    if EMBEDDING_BACKEND == "onnx" and EMBEDDING_QUANTIZATION and not EMBEDDING_ONNX_FILE:
+        return _load_quantized_onnx_model()
+    model_kwargs = {"file_name": EMBEDDING_ONNX_FILE} if EMBEDDING_ONNX_FILE else None
+    return SentenceTransformer(
+        EMBEDDING_MODEL_NAME,
+        device=ACE_DEVICE,
+        backend=EMBEDDING_BACKEND,
+        model_kwargs=model_kwargs,
+    )
+
+
+def _load_quantized_onnx_model() -> "SentenceTransformer":
+    """Loads an int8 dynamically quantized ONNX export, creating it on first use.
+
+    Quantization halves model memory and uses the CPU's int8 dot-product
+    instructions (e.g. AVX512-VNNI), at a negligible similarity cost.
+    """
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    local_dir = os.path.join(EMBEDDING_EXPORT_DIR, EMBEDDING_MODEL_NAME.replace("/", "__"))
+    file_name = f"onnx/model_qint8_{EMBEDDING_QUANTIZATION}.onnx"
+    if not os.path.exists(os.path.join(local_dir, file_name)):
+        model = SentenceTransformer(EMBEDDING_MODEL_NAME, device=ACE_DEVICE, backend="onnx")
+        model.save_pretrained(local_dir)
+        export_dynamic_quantized_onnx_model(model, EMBEDDING_QUANTIZATION, local_dir)
+    return SentenceTransformer(local_dir, device=ACE_DEVICE, backend="onnx", model_kwargs={"file_name": file_name})
@@ -0,0 +1,69 @@
+"""
+Micro-batching front end for the shared embedding model.
+Single-text encode requests issued concurrently (UI searches, worker tasks)
+are coalesced into one encoder forward pass instead of N serial ones.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Tuple
+
+import numpy as np
+
+# (texts, normalize_embeddings) -> (n, d) float32 array
+EncodeFn = Callable[[List[str], bool], np.ndarray]
+
+
+class EncodeBatcher:
+    """Coalesces concurrent single-text encode requests into batched encoder calls.
+
+    A daemon thread takes the oldest request, gathers whatever else arrives
+    within `max_wait_ms` (up to `max_batch` texts) and runs one encode per
+    normalization setting. With `max_wait_ms=0` only requests that are
+    already queued are merged, so a lone request pays no extra latency.
+    """
+
+    def __init__(self, encode_fn: EncodeFn, max_batch: int = 32, max_wait_ms: float = 0.0):
+        self._encode_fn = encode_fn
+        self._max_batch = max(1, max_batch)
+        self._max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: "queue.Queue[Tuple[str, bool, Future]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="ace-encode-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, text: str, normalize: bool) -> Future:
+        """Queues `text` for encoding; the future resolves to a 1-D float32 vector."""
+        future: Future = Future()
+        self._queue.put((text, normalize, future))
+        return future
+
+    def encode(self, text: str, normalize: bool) -> np.ndarray:
+        """Encodes `text`, blocking until its batch has run."""
+        return self.submit(text, normalize).result()
+
+    def _collect(self) -> List[Tuple[str, bool, Future]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self._max_wait
+        while len(batch) < self._max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+        return [item for item in batch if item[2].set_running_or_notify_cancel()]
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            for normalize in {item[1] for item in batch}:
+                group = [(text, future) for text, n, future in batch if n == normalize]
+                try:
+                    vectors = self._encode_fn([text for text, _ in group], normalize)
+                except Exception as e:
+                    for _, future in group:
+                        future.set_exception(e)
+                    continue
+                for (_, future), vector in zip(group, vectors):
+                    future.set_result(vector)
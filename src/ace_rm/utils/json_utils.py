@@ -0,0 +1,35 @@
+"""
+JSON helpers shared by the Curator node and the BackgroundWorker.
+LLM responses often wrap their JSON in Markdown code fences; the fence
+pattern is compiled once at import time and parsing uses orjson.
+"""
+import re
+from typing import Any
+
+import orjson
+
+# Captures the body of the first ```json ... ``` (or bare ``` ... ```) block.
+_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)\s*```", re.S)
+
+
+def parse_llm_json(text: str) -> Any:
+    """
+    Parses a JSON payload from an LLM response, unwrapping a fenced code
+    block if present.
+
+    Raises:
+        orjson.JSONDecodeError: If the payload is not valid JSON
+            (a subclass of json.JSONDecodeError / ValueError).
+    """
+    payload = text.strip()
+    # Bare JSON (the common case with JSON-mode models) skips the fence scan.
+    if not payload.startswith(("{", "[")):
+        m = _FENCE_RE.search(text)
+        if m:
+            payload = m.group(1)
+    return orjson.loads(payload)
+
+
+def dumps_compact(obj: Any) -> str:
+    """Serializes to JSON without the default whitespace after separators."""
+    return orjson.dumps(obj).decode()
@@ -0,0 +1,69 @@
+"""
+Shared LLM client manager.
+All sessions and BackgroundWorkers talk to the same OpenAI-compatible
+endpoint, so they share one ChatOpenAI instance per configuration instead
+of constructing and validating a new client for every session.
+Async calls go through `loop_local_llm`, since pooled async connections
+cannot be shared between event loops.
+"""
+import asyncio
+import threading
+import weakref
+from typing import Any, Dict, Tuple
+
+import httpx
+from langchain_openai import ChatOpenAI
+
+from ace_rm.config import MODEL_NAME, BASE_URL, OPENAI_API_KEY, LLM_TEMPERATURE
+
+_llms: Dict[bool, ChatOpenAI] = {}
+_lock = threading.Lock()
+# Per event loop: id(llm) -> (llm, copy with that loop's own async HTTP client).
+_loop_llms: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[int, Tuple[Any, ChatOpenAI]]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_llm(streaming: bool = False) -> ChatOpenAI:
+    """
+    Returns the shared ChatOpenAI client configured from config.py.
+    Thread-safe; one instance is created per `streaming` setting.
+    """
+    llm = _llms.get(streaming)
+    if llm is None:
+        with _lock:
+            llm = _llms.get(streaming)
+            if llm is None:
+                llm = ChatOpenAI(
+                    model=MODEL_NAME,
+                    api_key=OPENAI_API_KEY,
+                    base_url=BASE_URL,
+                    temperature=LLM_TEMPERATURE,
+                    streaming=streaming,
+                )
+                _llms[streaming] = llm
+    return llm
+
+
+def loop_local_llm(llm: Any) -> Any:
+    """Returns `llm` with an async HTTP client owned by the running event loop.
+
+    langchain-openai shares one pooled httpx.AsyncClient per base_url, and a
+    pooled connection opened on one loop fails when awaited from another
+    ("... is bound to a different event loop"). The Gradio loop and the
+    background worker's loop therefore each get their own copy, cached per
+    loop. Anything other than a ChatOpenAI (e.g. a test double) is returned as is.
+    """
+    if not isinstance(llm, ChatOpenAI):
+        return llm
+    loop = asyncio.get_running_loop()
+    with _lock:
+        per_loop = _loop_llms.setdefault(loop, {})
+        entry = per_loop.get(id(llm))
+        if entry is None or entry[0] is not llm:
+            local = llm.model_copy(update={
+                "http_async_client": httpx.AsyncClient(), "async_client": None, "root_async_client": None
+            })
+            entry = per_loop[id(llm)] = (llm, local.validate_environment())
+    return entry[1]
+
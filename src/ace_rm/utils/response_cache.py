@@ -0,0 +1,95 @@
+"""
+Semantic response cache for the chat front end.
+A message that is a near-duplicate of an earlier one (cosine similarity of
+the query embeddings above a threshold) under the same context key is served
+the earlier reply instead of running the agent graph and its LLM calls.
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+import numpy as np
+
+
+class SemanticResponseCache:
+    """LRU cache of chat outputs, matched by embedding similarity within an exact context key.
+
+    The context key should capture everything besides the message that the
+    reply depends on (e.g. response style and recent turns).
+    """
+
+    def __init__(self, threshold: float = 0.95, maxsize: int = 1024, quantize: bool = False):
+        self.threshold = threshold
+        self.maxsize = max(1, maxsize)
+        # int8 storage with a per-vector scale: a quarter of the memory, cosine error ~1e-3.
+        self.quantize = quantize
+        # entry id -> (context key, (stored vector, scale), payload), least recently used first
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        # context key -> [entry ids, (stacked vectors, scales) or None until the next lookup]
+        self._by_key: Dict[Hashable, list] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _unit(vector: np.ndarray) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        norm = float(np.sqrt(vector @ vector))
+        return vector / norm if norm > 0 else vector
+
+    def _encode(self, unit: np.ndarray) -> Tuple[np.ndarray, float]:
+        if not self.quantize:
+            return unit, 1.0
+        scale = float(np.abs(unit).max()) / 127.0
+        if scale == 0.0:
+            return unit.astype(np.int8), 1.0
+        return np.round(unit / scale).astype(np.int8), scale
+
+    def lookup(self, context_key: Hashable, vector: np.ndarray) -> Optional[Dict[str, Any]]:
+        """Returns the payload of the most similar entry under `context_key`, or None."""
+        query = self._unit(vector)
+        with self._lock:
+            group = self._by_key.get(context_key)
+            if group is None:
+                return None
+            ids, stacked = group
+            if stacked is None:
+                # Stacked once per change to the group, so lookups are a single mat-vec product.
+                encoded = [self._entries[entry_id][1] for entry_id in ids]
+                stacked = group[1] = (
+                    np.vstack([vector for vector, _ in encoded]),
+                    np.array([scale for _, scale in encoded], dtype=np.float32),
+                )
+            matrix, scales = stacked
+            scores = (matrix @ query) * scales
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+            entry_id = ids[best]
+            self._entries.move_to_end(entry_id)
+            return self._entries[entry_id][2]
+
+    def store(self, context_key: Hashable, vector: np.ndarray, payload: Dict[str, Any]):
+        """Caches `payload` for the query `vector`, evicting the least recently used entry if full."""
+        encoded = self._encode(self._unit(vector))
+        with self._lock:
+            self._entries[self._next_id] = (context_key, encoded, payload)
+            group = self._by_key.setdefault(context_key, [[], None])
+            group[0].append(self._next_id)
+            group[1] = None
+            self._next_id += 1
+            while len(self._entries) > self.maxsize:
+                entry_id, (key, _, _) = self._entries.popitem(last=False)
+                group = self._by_key[key]
+                group[0].remove(entry_id)
+                group[1] = None
+                if not group[0]:
+                    del self._by_key[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_key.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,112 @@
+"""
+Bounded, idle-expiring store for per-session agents.
+In isolated mode every browser session owns an ACE_Memory (with its FAISS
+index) and a TaskQueue; without a bound these accumulate for the life of the
+process.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Generic, Hashable, List, Optional, Tuple, TypeVar
+
+V = TypeVar("V")
+_MISSING = object()
+
+
+class SessionCache(Generic[V]):
+    """LRU mapping whose entries also expire after `ttl` seconds without access.
+
+    Evicted entries are passed to `on_evict(key, value)` outside the lock, so
+    the callback may block (e.g. flush an index to disk). A returning session is
+    simply created again, so anything the callback does not persist is lost.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 3600.0,
+                 on_evict: Optional[Callable[[Hashable, V], Any]] = None):
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self._on_evict = on_evict
+        self._entries: "OrderedDict[Hashable, Tuple[V, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Locks for keys being created; kept only until the entry is stored.
+        self._building: Dict[Hashable, threading.Lock] = {}
+
+    def get_or_create(self, key: Hashable, factory: Callable[[], V]) -> V:
+        """Returns the entry for `key`, creating it with `factory()` if missing.
+
+        Creation runs under a per-key lock, so one key is never built twice
+        while lookups and creation of other keys proceed.
+        """
+        with self._lock:
+            value, evicted = self._touch(key)
+            if value is not _MISSING:
+                self._evict(evicted)
+                return value
+            key_lock = self._building.setdefault(key, threading.Lock())
+        self._evict(evicted)
+
+        with key_lock:
+            with self._lock:
+                # Another caller may have built it while we waited.
+                value, evicted = self._touch(key)
+            if value is _MISSING:
+                value = factory()
+                with self._lock:
+                    now = time.monotonic()
+                    self._entries[key] = (value, now)
+                    self._entries.move_to_end(key)
+                    evicted += self._expire(now)
+                    if self._building.get(key) is key_lock:
+                        del self._building[key]
+        self._evict(evicted)
+        return value
+
+    def pop(self, key: Hashable) -> Optional[V]:
+        """Removes `key` without calling `on_evict`."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        return entry[0] if entry is not None else None
+
+    def items(self) -> List[Tuple[Hashable, V]]:
+        """Returns a snapshot of (key, value) pairs, least recently used first."""
+        with self._lock:
+            return [(key, value) for key, (value, _) in self._entries.items()]
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def _touch(self, key: Hashable) -> Tuple[Any, List[Tuple[Hashable, V]]]:
+        """Returns (value or _MISSING, evicted) for `key`, refreshing a live entry (caller holds the lock)."""
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and now - entry[1] <= self.ttl:
+            self._entries[key] = (entry[0], now)
+            self._entries.move_to_end(key)
+            return entry[0], self._expire(now)
+        evicted = [(key, self._entries.pop(key)[0])] if entry is not None else []
+        return _MISSING, evicted + self._expire(now)
+
+    def _expire(self, now: float) -> List[Tuple[Hashable, V]]:
+        """Pops entries past the TTL or over capacity (caller holds the lock)."""
+        evicted = []
+        while self._entries:
+            key, (value, last_used) = next(iter(self._entries.items()))
+            if len(self._entries) <= self.maxsize and now - last_used <= self.ttl:
+                break
+            del self._entries[key]
+            evicted.append((key, value))
+        return evicted
+
+    def _evict(self, evicted: List[Tuple[Hashable, V]]):
+        if self._on_evict is None:
+            return
+        for key, value in evicted:
+            try:
+                self._on_evict(key, value)
+            except Exception as e:
+                print(f"[SessionCache] Error evicting {key}: {e}", flush=True)
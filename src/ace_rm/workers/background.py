@@ -1,14 +1,20 @@
+import asyncio
 import threading
-import time
-import json
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple, Union
 
 from langchain_core.messages import HumanMessage
 from langchain_openai import ChatOpenAI
 
 from ace_rm import prompts
+from ace_rm.agent.schemas import ReflectionResult
+from ace_rm.config import STRUCTURED_OUTPUT, WORKER_CONCURRENCY, WORKER_MAX_IDLE_WAIT
 from ace_rm.memory.core import ACE_Memory
 from ace_rm.memory.queue import TaskQueue
+from ace_rm.utils.json_utils import parse_llm_json
+from ace_rm.utils.llm_manager import loop_local_llm
+
+# (content, entities, problem_class) of a document to be added to memory.
+NewDoc = Tuple[str, List[str], str]
 
 class BackgroundWorker(threading.Thread):
     """Asynchronous worker that processes the task queue.
@@ -17,35 +23,133 @@ class BackgroundWorker(threading.Thread):
     recent interactions and update the Long-Term Memory.
     """
 
-    def __init__(self, llm: ChatOpenAI, memory: ACE_Memory, task_queue: TaskQueue, interval: float = 1.0):
+    def __init__(self, llm: ChatOpenAI, memory: ACE_Memory, task_queue: TaskQueue, interval: float = 1.0,
+                 concurrency: int = WORKER_CONCURRENCY):
         super().__init__(daemon=True)
         self.memory = memory
         self.task_queue = task_queue
         self.llm = llm
+        self.reflection_llm = llm.with_structured_output(ReflectionResult) if STRUCTURED_OUTPUT else None
+        # (llm, reflection_llm) bound to the event loop of the latest async call.
+        self._async_llms: Tuple[Any, Any] = (llm, self.reflection_llm)
         self.interval = interval
+        self.concurrency = max(1, concurrency)
         self.running = True
 
     def run(self):
         print("[BackgroundWorker] Started.", flush=True)
+        asyncio.run(self._run_loop())
+
+    async def _run_loop(self):
+        # LLM calls are awaited so up to `concurrency` tasks overlap their network time;
+        # blocking SQLite/FAISS/encoder work is pushed to the default thread pool.
+        idle_wait = self.interval
         while self.running:
             try:
-                task = self.task_queue.fetch_pending_task()
-                if task:
-                    self.process_task(task)
+                tasks = await asyncio.to_thread(self.task_queue.claim_pending_tasks, self.concurrency)
+                if tasks:
+                    idle_wait = self.interval
+                    await self.process_batch_async(tasks)
+                elif WORKER_MAX_IDLE_WAIT <= 0:
+                    # Signal-only mode: sleep until enqueue_task() or stop() sets the wake event.
+                    await asyncio.to_thread(self.task_queue.wait_for_task)
                 else:
-                    time.sleep(self.interval)
+                    # Woken instantly by enqueue_task(); the wait only bounds how long
+                    # tasks enqueued by other processes can sit, so back off while idle.
+                    woken = await asyncio.to_thread(self.task_queue.wait_for_task, idle_wait)
+                    idle_wait = self.interval if woken else min(idle_wait * 2, WORKER_MAX_IDLE_WAIT)
             except Exception as e:
                 print(f"[BackgroundWorker] Loop Error: {e}", flush=True)
-                time.sleep(5.0)
+                await asyncio.sleep(5.0)
 
     def stop(self):
         self.running = False
+        self.task_queue.notify()
 
     def process_task(self, task: Dict[str, Any]):
         task_id = task['id']
         print(f"[BackgroundWorker] Processing Task {task_id}...", flush=True)
-        self.task_queue.mark_task_processing(task_id)
+        if task.get('status') == 'pending':  # Not yet claimed via claim_pending_tasks()
+            self.task_queue.mark_task_processing(task_id)
+        prompt = self._build_prompt(task)
+        try:
+            res = self.task_queue.get_cached_analysis(prompt)
+            if res is not None:
+                print(f"[BackgroundWorker] Task {task_id}: reusing cached analysis.", flush=True)
+                self._apply_result(task_id, res)
+                return
+            if self.reflection_llm is not None:
+                res = self.reflection_llm.invoke([HumanMessage(content=prompt)]).model_dump()
+            else:
+                res = self.llm.invoke([HumanMessage(content=prompt)]).content
+            self._apply_result(task_id, res, cache_prompt=prompt)
+        except Exception as e:
+            print(f"[BackgroundWorker] Task {task_id} Failed: {e}", flush=True)
+            self.task_queue.mark_task_failed(task_id, str(e))
+
+    async def process_task_async(self, task: Dict[str, Any]) -> Optional[Tuple[int, Optional[NewDoc]]]:
+        """Async variant of process_task() used by the worker loop.
+
+        New documents and completion are not written here; they are returned
+        so the loop can commit the whole batch via _commit_batch().
+
+        Returns:
+            (task_id, new document or None), or None if the task failed.
+        """
+        task_id = task['id']
+        print(f"[BackgroundWorker] Processing Task {task_id}...", flush=True)
+        if task.get('status') == 'pending':
+            await asyncio.to_thread(self.task_queue.mark_task_processing, task_id)
+        try:
+            prompt = await asyncio.to_thread(self._build_prompt, task)
+            res = await asyncio.to_thread(self.task_queue.get_cached_analysis, prompt)
+            if res is not None:
+                print(f"[BackgroundWorker] Task {task_id}: reusing cached analysis.", flush=True)
+                return task_id, await asyncio.to_thread(self._handle_result, res)
+            llm, reflection_llm = self._loop_llms()
+            if reflection_llm is not None:
+                res = (await reflection_llm.ainvoke([HumanMessage(content=prompt)])).model_dump()
+            else:
+                res = (await llm.ainvoke([HumanMessage(content=prompt)])).content
+            new_doc = await asyncio.to_thread(self._handle_result, res, prompt)
+            return task_id, new_doc
+        except Exception as e:
+            print(f"[BackgroundWorker] Task {task_id} Failed: {e}", flush=True)
+            await asyncio.to_thread(self.task_queue.mark_task_failed, task_id, str(e))
+            return None
+
+    def _loop_llms(self) -> Tuple[Any, Any]:
+        """Returns (llm, reflection_llm) using the running loop's own HTTP client.
 
+        The worker's loop must not reuse connections pooled by the UI's loop;
+        see `loop_local_llm`.
+        """
+        llm = loop_local_llm(self.llm)
+        if llm is not self._async_llms[0]:
+            self._async_llms = (llm, llm.with_structured_output(ReflectionResult) if STRUCTURED_OUTPUT else None)
+        return self._async_llms
+
+    async def process_batch_async(self, tasks: List[Dict[str, Any]]):
+        """Processes claimed tasks concurrently and commits their results in one transaction."""
+        results = await asyncio.gather(*(self.process_task_async(task) for task in tasks))
+        await asyncio.to_thread(self._commit_batch, [r for r in results if r is not None])
+
+    def _commit_batch(self, results: List[Tuple[int, Optional[NewDoc]]]):
+        """Adds all new documents of a batch in one transaction, then marks its tasks done."""
+        if not results:
+            return
+        task_ids = [task_id for task_id, _ in results]
+        new_docs = [doc for _, doc in results if doc is not None]
+        try:
+            if new_docs:
+                self.memory.add_many(new_docs)
+            self.task_queue.mark_tasks_complete(task_ids)
+        except Exception as e:
+            print(f"[BackgroundWorker] Batch commit failed: {e}", flush=True)
+            for task_id in task_ids:
+                self.task_queue.mark_task_failed(task_id, str(e))
+
+    def _build_prompt(self, task: Dict[str, Any]) -> str:
         user_input = task['user_input']
         agent_output = task['agent_output']
         
@@ -73,42 +177,143 @@ class BackgroundWorker(threading.Thread):
         # The prompts module already handles language selection based on ACE_LANG
         prompt_tmpl = prompts.UNIFIED_ANALYSIS_PROMPT
 
-        prompt = prompt_tmpl.format(
+        return prompt_tmpl.format(
             user_input=user_input, 
             agent_output=agent_output,
             existing_docs=existing_docs_str
         )
+
+    def _apply_result(self, task_id: int, res: Union[str, Dict[str, Any]], cache_prompt: Optional[str] = None):
+        new_doc = self._handle_result(res, cache_prompt)
+        if new_doc is not None:
+            self.memory.add(*new_doc)
+        self.task_queue.mark_task_complete(task_id)
+
+    def _handle_result(self, res: Union[str, Dict[str, Any]], cache_prompt: Optional[str] = None) -> Optional[NewDoc]:
+        """Applies UPDATE/KEPT decisions and returns the document to add for NEW ones.
+
+        Args:
+            res: The raw LLM reply, or an already-parsed structured-output dict.
+            cache_prompt: If given, the parsed result is cached under this prompt.
+        """
+        data = res if isinstance(res, dict) else parse_llm_json(res)
+        if cache_prompt is not None:
+            self.task_queue.cache_analysis(cache_prompt, data)
         
-        try:
-            res = self.llm.invoke([HumanMessage(content=prompt)]).content.strip()
-            if "```json" in res:
-                res = res.split("```json")[1].split("```")[0]
-            elif "```" in res:
-                res = res.split("```")[1].split("```")[0]
-            
-            data = json.loads(res)
-            
-            should_store = data.get('should_store', False)
-            if should_store:
-                action = data.get('action', 'NEW').upper()
-                target_doc_id = data.get('target_doc_id')
-                new_content = data.get('analysis', '')
-                new_entities = data.get('entities', [])
-                new_p_class = data.get('problem_class', '')
-
-                if action == 'UPDATE' and target_doc_id is not None:
-                    print(f"[BackgroundWorker] Updating Doc {target_doc_id}", flush=True)
-                    self.memory.update_document(target_doc_id, new_content, new_entities, new_p_class)
-                elif action == 'KEPT':
-                    print("[BackgroundWorker] Knowledge kept (redundant).", flush=True)
-                else: # NEW
-                    print("[BackgroundWorker] Adding NEW Doc", flush=True)
-                    self.memory.add(new_content, new_entities, new_p_class)
-            else:
-                 print("[BackgroundWorker] Ignored (should_store=False).", flush=True)
-            
-            self.task_queue.mark_task_complete(task_id)
+        should_store = data.get('should_store', False)
+        if should_store:
+            action = data.get('action', 'NEW').upper()
+            target_doc_id = data.get('target_doc_id')
+            new_content = data.get('analysis', '')
+            new_entities = data.get('entities', [])
+            new_p_class = data.get('problem_class', '')
 
-        except Exception as e:
-            print(f"[BackgroundWorker] Task {task_id} Failed: {e}", flush=True)
-            self.task_queue.mark_task_failed(task_id, str(e))
+            if action == 'UPDATE' and target_doc_id is not None:
+                print(f"[BackgroundWorker] Updating Doc {target_doc_id}", flush=True)
+                self.memory.update_document(target_doc_id, new_content, new_entities, new_p_class)
+            elif action == 'KEPT':
+                print("[BackgroundWorker] Knowledge kept (redundant).", flush=True)
+            else: # NEW
+                print("[BackgroundWorker] Adding NEW Doc", flush=True)
+                return new_content, new_entities, new_p_class
+        else:
+             print("[BackgroundWorker] Ignored (should_store=False).", flush=True)
+        return None
+
+
+class SharedBackgroundWorker(threading.Thread):
+    """One worker thread serving the task queues of many sessions.
+
+    Isolated sessions each keep their own database, so instead of one
+    BackgroundWorker thread and event loop per session, per-session
+    BackgroundWorkers are attached here unstarted and used only to process
+    and commit their tasks. `concurrency` bounds the in-flight tasks across
+    all attached sessions. A detached session's worker is kept until its
+    queue is drained, then its memory is flushed and it is dropped.
+    """
+
+    def __init__(self, interval: float = 1.0, concurrency: int = WORKER_CONCURRENCY):
+        super().__init__(daemon=True, name="ace-shared-worker")
+        self.interval = interval
+        self.concurrency = max(1, concurrency)
+        self.running = True
+        self._workers: Dict[Any, BackgroundWorker] = {}
+        # Detached workers still finishing their pending tasks.
+        self._retiring: List[BackgroundWorker] = []
+        self._workers_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._turn = 0
+
+    def attach(self, key: Any, worker: BackgroundWorker):
+        """Starts serving `worker`'s queue; its enqueues now wake this thread."""
+        worker.task_queue.use_wake_event(self._wake)
+        with self._workers_lock:
+            self._workers[key] = worker
+        self._wake.set()
+
+    def detach(self, key: Any) -> Optional[BackgroundWorker]:
+        """Detaches `key`'s worker. Its in-flight and pending tasks are still processed
+        (after those of attached sessions), then its memory is flushed."""
+        with self._workers_lock:
+            worker = self._workers.pop(key, None)
+            if worker is not None:
+                self._retiring.append(worker)
+        if worker is not None:
+            self._wake.set()
+        return worker
+
+    def run(self):
+        print("[SharedBackgroundWorker] Started.", flush=True)
+        asyncio.run(self._run_loop())
+
+    def _claim(self) -> List[Tuple[BackgroundWorker, List[Dict[str, Any]]]]:
+        """Claims up to `concurrency` tasks, starting from a different session each round.
+
+        Retiring workers come last; one with nothing left to claim has no batch
+        in flight either (claims wait for the previous round), so it is flushed
+        and dropped.
+        """
+        with self._workers_lock:
+            workers = list(self._workers.values())
+            retiring = list(self._retiring)
+        if not workers and not retiring:
+            return []
+        if workers:
+            self._turn = (self._turn + 1) % len(workers)
+        budget = self.concurrency
+        batches = []
+        for worker in workers[self._turn:] + workers[:self._turn] + retiring:
+            if budget <= 0:
+                break
+            tasks = worker.task_queue.claim_pending_tasks(budget)
+            if tasks:
+                batches.append((worker, tasks))
+                budget -= len(tasks)
+            elif worker in retiring:
+                with self._workers_lock:
+                    self._retiring.remove(worker)
+                worker.memory.flush()
+        return batches
+
+    async def _run_loop(self):
+        idle_wait = self.interval
+        while self.running:
+            try:
+                batches = await asyncio.to_thread(self._claim)
+                if batches:
+                    idle_wait = self.interval
+                    await asyncio.gather(*(worker.process_batch_async(tasks) for worker, tasks in batches))
+                    continue
+                if WORKER_MAX_IDLE_WAIT <= 0:
+                    woken = await asyncio.to_thread(self._wake.wait)
+                else:
+                    woken = await asyncio.to_thread(self._wake.wait, idle_wait)
+                    idle_wait = self.interval if woken else min(idle_wait * 2, WORKER_MAX_IDLE_WAIT)
+                self._wake.clear()
+            except Exception as e:
+                print(f"[SharedBackgroundWorker] Loop Error: {e}", flush=True)
+                await asyncio.sleep(5.0)
+
+    def stop(self):
+        self.running = False
+        self._wake.set()
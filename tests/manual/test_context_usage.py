@@ -5,6 +5,7 @@ Test to verify that retrieved context is actually used in agent responses
 import sys
 sys.path.insert(0, 'src')
 from ace_rm.ace_framework import build_ace_agent, ACE_Memory
+from ace_rm.agent.graph import agent_messages
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage
 import os
@@ -97,14 +98,15 @@ def test_context_usage():
     print("VERDICT")
     print("=" * 80)
     
-    has_context_msg = any("Retrieved Context" in str(msg.content) for msg in messages)
+    # Retrieved context is injected into the agent's prompt, not stored in the history.
+    has_context_msg = any("Retrieved Context" in str(msg.content) for msg in agent_messages(final_state))
     context_retrieved = len(context_docs) > 0
     
     if has_context_msg and context_retrieved:
-        print("\n✓ SUCCESS: Context was retrieved AND injected into messages")
+        print("\n✓ SUCCESS: Context was retrieved AND injected into the agent prompt")
         print("✓ The agent SHOULD have access to the context")
     elif context_retrieved and not has_context_msg:
-        print("\n⚠️  WARNING: Context was retrieved but NOT found in messages")
+        print("\n⚠️  WARNING: Context was retrieved but NOT found in the agent prompt")
         print("⚠️  This indicates a potential bug")
     elif not context_retrieved:
         print("\n⚠️  INFO: No relevant context was found for the query")
@@ -1,10 +1,15 @@
 import pytest
+import asyncio
 import json
 import sqlite3
+import threading
+import time
 import uuid
-from unittest.mock import MagicMock
-from ace_rm.ace_framework import ACE_Memory, TaskQueue, BackgroundWorker
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import AsyncMock, MagicMock
+from ace_rm.ace_framework import ACE_Memory, TaskQueue, BackgroundWorker, SharedBackgroundWorker
 from langchain_core.messages import AIMessage
+from langchain_openai import ChatOpenAI
 
 @pytest.fixture
 def memory_and_queue():
@@ -43,6 +48,27 @@ def test_queue_operations(memory_and_queue):
         row = cursor.fetchone()
         assert row[0] == 'done'
 
+def test_claim_pending_tasks(memory_and_queue):
+    mem, queue = memory_and_queue
+    for i in range(3):
+        queue.enqueue_task(f"Q{i}", f"A{i}")
+
+    claimed = queue.claim_pending_tasks(2)
+    assert [t['user_input'] for t in claimed] == ["Q0", "Q1"]
+    assert all(t['status'] == 'processing' for t in claimed)
+
+    # Already-claimed tasks are never handed out again.
+    rest = queue.claim_pending_tasks(5)
+    assert [t['user_input'] for t in rest] == ["Q2"]
+    assert queue.claim_pending_tasks(5) == []
+
+    queue.mark_tasks_complete([claimed[0]['id']])
+    assert queue.get_status_summary() == {"done": 1, "processing": 2}
+    # Empty claims (idle worker polls) are not reported as changes.
+    version = queue.data_version
+    queue.claim_pending_tasks(5)
+    assert queue.data_version == version
+
 def test_background_worker_process_success(memory_and_queue):
     mem, queue = memory_and_queue
     # Mock LLM
@@ -122,4 +148,145 @@ def test_background_worker_invalid_json(memory_and_queue):
         row = cursor.fetchone()
         assert row[0] == 'failed'
         # Error message should mention JSON or something related
-        assert row[1] is not None
\ No newline at end of file
+        assert row[1] is not None
+
+
+def test_enqueue_drops_immediate_repeat(memory_and_queue):
+    mem, queue = memory_and_queue
+    assert queue.enqueue_task("Q", "A") is True
+    assert queue.enqueue_task("Q", "A") is False  # Double submit
+    assert queue.enqueue_task("Q", "B") is True
+    assert [t['user_input'] for t in queue.claim_pending_tasks(5)] == ["Q", "Q"]
+
+
+def test_enqueue_retry_after_failed_insert_is_kept(memory_and_queue, monkeypatch):
+    mem, queue = memory_and_queue
+    monkeypatch.setattr(queue, "_write", MagicMock(side_effect=sqlite3.OperationalError("database is locked")))
+    with pytest.raises(sqlite3.OperationalError):
+        queue.enqueue_task("Q", "A")
+    monkeypatch.undo()
+    assert queue.enqueue_task("Q", "A") is True
+
+
+def test_background_worker_reuses_cached_analysis(memory_and_queue, monkeypatch):
+    """An identical reflection prompt is answered from reflector_cache without the LLM."""
+    monkeypatch.setattr("ace_rm.memory.queue.ENQUEUE_DEDUP_WINDOW", 0)
+    mem, queue = memory_and_queue
+    mock_llm = MagicMock()
+    mock_llm.invoke.return_value = AIMessage(content=json.dumps({"should_store": False}))
+
+    worker = BackgroundWorker(llm=mock_llm, memory=mem, task_queue=queue)
+    for _ in range(2):
+        queue.enqueue_task("Same question", "Same answer")
+        worker.process_task(queue.fetch_pending_task())
+
+    assert mock_llm.invoke.call_count == 1
+    assert [t['status'] for t in queue.get_tasks()] == ['done', 'done']
+
+
+def test_shared_worker_drains_every_attached_queue():
+    """One SharedBackgroundWorker thread serves the queues of several sessions."""
+    mock_llm = MagicMock()
+    mock_llm.ainvoke = AsyncMock(return_value=AIMessage(content=json.dumps({"should_store": False})))
+    shared = SharedBackgroundWorker(interval=0.05)
+    queues = []
+    for i in range(2):
+        session_id = f"test_shared_{uuid.uuid4()}"
+        queue = TaskQueue(session_id=session_id)
+        shared.attach(session_id, BackgroundWorker(llm=mock_llm, memory=ACE_Memory(session_id=session_id), task_queue=queue))
+        queue.enqueue_task(f"Q{i}", f"A{i}")
+        queues.append(queue)
+    shared.start()
+    try:
+        deadline = time.monotonic() + 5.0
+        while time.monotonic() < deadline and any(q.get_status_summary() != {"done": 1} for q in queues):
+            time.sleep(0.05)
+        assert [q.get_status_summary() for q in queues] == [{"done": 1}, {"done": 1}]
+    finally:
+        shared.stop()
+        shared.join(timeout=2.0)
+        for queue in queues:
+            queue.clear()
+
+
+def test_expired_analyses_are_evicted_on_write(memory_and_queue):
+    mem, queue = memory_and_queue
+    queue.cache_analysis("old prompt", {"should_store": False})
+    with queue._write() as conn:
+        conn.execute("UPDATE reflector_cache SET ts = datetime('now', '-2 days')")
+    assert queue.get_cached_analysis("old prompt") is None
+
+    queue.cache_analysis("new prompt", {"should_store": True})
+    assert queue.get_cached_analysis("new prompt") == {"should_store": True}
+    rows = queue._connect().execute("SELECT COUNT(*) FROM reflector_cache").fetchone()[0]
+    assert rows == 1
+
+
+def test_detached_session_is_drained_then_flushed():
+    mock_llm = MagicMock()
+    mock_llm.ainvoke = AsyncMock(return_value=AIMessage(content=json.dumps({"should_store": False})))
+    shared = SharedBackgroundWorker(interval=0.05)
+    session_id = f"test_shared_{uuid.uuid4()}"
+    queue = TaskQueue(session_id=session_id)
+    memory = ACE_Memory(session_id=session_id)
+    memory.flush = MagicMock(wraps=memory.flush)
+    shared.attach(session_id, BackgroundWorker(llm=mock_llm, memory=memory, task_queue=queue))
+    queue.enqueue_task("Q", "A")
+    shared.detach(session_id)
+    shared.start()
+    try:
+        deadline = time.monotonic() + 5.0
+        while time.monotonic() < deadline and not memory.flush.called:
+            time.sleep(0.05)
+        assert queue.get_status_summary() == {"done": 1}
+        assert memory.flush.called and not shared._retiring
+    finally:
+        shared.stop()
+        shared.join(timeout=2.0)
+        queue.clear()
+
+
+class _KeepAliveChatStub(BaseHTTPRequestHandler):
+    """Minimal OpenAI-compatible endpoint that keeps connections open, like a real server."""
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        body = json.dumps({
+            "id": "stub", "object": "chat.completion", "created": 0, "model": "stub",
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": json.dumps({"should_store": False})}}]
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_worker_and_ui_loops_share_one_llm(memory_and_queue, monkeypatch):
+    """The UI and the worker await the same ChatOpenAI from different event loops."""
+    monkeypatch.setattr("ace_rm.memory.queue.ENQUEUE_DEDUP_WINDOW", 0)
+    mem, queue = memory_and_queue
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _KeepAliveChatStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    llm = ChatOpenAI(model="stub", api_key="stub", base_url=f"http://127.0.0.1:{server.server_port}/v1", max_retries=0)
+    worker = BackgroundWorker(llm=llm, memory=mem, task_queue=queue)
+    ui_loop, worker_loop = asyncio.new_event_loop(), asyncio.new_event_loop()
+    for loop in (ui_loop, worker_loop):
+        threading.Thread(target=loop.run_forever, daemon=True).start()
+    try:
+        for i in range(3):
+            asyncio.run_coroutine_threadsafe(llm.ainvoke("hi"), ui_loop).result(10)
+            queue.enqueue_task(f"Q{i}", f"A{i}")
+            batch = queue.claim_pending_tasks(1)
+            asyncio.run_coroutine_threadsafe(worker.process_batch_async(batch), worker_loop).result(10)
+        assert queue.get_status_summary() == {"done": 3}
+    finally:
+        for loop in (ui_loop, worker_loop):
+            loop.call_soon_threadsafe(loop.stop)
+        server.shutdown()
+
@@ -0,0 +1,38 @@
+import threading
+
+import numpy as np
+import pytest
+
+from ace_rm.utils.encode_batcher import EncodeBatcher
+
+
+def test_concurrent_requests_share_encoder_calls():
+    calls = []
+    started, release = threading.Event(), threading.Event()
+
+    def encode(texts, normalize):
+        calls.append(list(texts))
+        started.set()
+        release.wait(5)  # Hold the first call so later requests queue up behind it.
+        return np.array([[len(t), float(normalize)] for t in texts], dtype=np.float32)
+
+    batcher = EncodeBatcher(encode, max_batch=8)
+    first = batcher.submit("a", True)
+    assert started.wait(5)
+    futures = [batcher.submit("x" * n, True) for n in range(2, 6)]
+    release.set()
+    results = [f.result(5) for f in futures]
+
+    assert first.result(5).tolist() == [1.0, 1.0]
+    assert [r[0] for r in results] == [2.0, 3.0, 4.0, 5.0]
+    # One call for the first request, one for the four that queued behind it.
+    assert len(calls) == 2 and len(calls[1]) == 4
+
+
+def test_encoder_errors_propagate_to_callers():
+    def encode(texts, normalize):
+        raise RuntimeError("boom")
+
+    batcher = EncodeBatcher(encode)
+    with pytest.raises(RuntimeError, match="boom"):
+        batcher.encode("text", False)
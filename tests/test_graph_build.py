@@ -19,3 +19,88 @@ def test_graph_build():
     finally:
         if memory:
             memory.clear()
+
+
+def test_agents_share_compiled_graph():
+    from ace_rm.agent.graph import get_compiled_graph
+    llm = ChatOpenAI(api_key="dummy", base_url="http://localhost")
+    memories = [ACE_Memory(session_id=f"test_graph_{uuid.uuid4()}") for _ in range(2)]
+    try:
+        first, second = (build_ace_agent(llm, m) for m in memories)
+        # with_config() yields a shallow copy that reuses the compiled nodes.
+        assert first.nodes["curator"] is second.nodes["curator"] is get_compiled_graph(True).nodes["curator"]
+        assert first.config["configurable"]["ace_deps"].memory is memories[0]
+    finally:
+        for m in memories:
+            m.clear()
+
+
+def test_repeated_turn_reuses_curator_analysis():
+    import json
+    from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+    from langchain_core.messages import AIMessage, HumanMessage
+    from ace_rm.ace_framework import TaskQueue
+    from ace_rm.agent.graph import cache_write_pool
+
+    session_id = f"test_graph_{uuid.uuid4()}"
+    memory, queue = ACE_Memory(session_id=session_id), TaskQueue(session_id=session_id)
+    intent = AIMessage(content=json.dumps({"entities": ["jug"], "problem_class": "P", "search_query": "jug"}))
+    # Only one intent reply: a second Curator LLM call would consume an answer instead.
+    llm = GenericFakeChatModel(messages=iter([intent, AIMessage(content="first"), AIMessage(content="second")]))
+    app = build_ace_agent(llm, memory, queue, use_tools=False)
+    state = {"messages": [HumanMessage(content="How do I measure 4L?")], "context_docs": [],
+             "extracted_entities": [], "problem_class": "", "retry_count": 0}
+    try:
+        assert app.invoke(state)["messages"][-1].content == "first"
+        cache_write_pool.submit(lambda: None).result()  # The analysis is cached in the background
+        retry = app.invoke(state)
+        assert retry["messages"][-1].content == "second"
+        assert retry["extracted_entities"] == ["jug"]
+    finally:
+        memory.clear()
+        queue.clear()
+
+
+def test_async_nodes_use_a_client_per_event_loop():
+    import asyncio
+    from ace_rm.agent.graph import AgentDeps
+
+    deps = AgentDeps(ChatOpenAI(api_key="dummy", base_url="http://localhost"), None, None, use_tools=True)
+
+    async def loop_deps():
+        return deps.for_running_loop(), deps.for_running_loop()
+
+    first, again = asyncio.run(loop_deps())
+    second, _ = asyncio.run(loop_deps())
+    assert first is again and first is not deps
+    assert first.llm.root_async_client is not deps.llm.root_async_client
+    assert second.llm.root_async_client is not first.llm.root_async_client
+
+
+def test_refined_query_discards_failed_speculative_search(caplog):
+    import asyncio
+    import gc
+    import json
+    from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+    from langchain_core.messages import AIMessage, HumanMessage
+
+    memory = ACE_Memory(session_id=f"test_graph_{uuid.uuid4()}")
+    raw_input = "How do I measure 4L?"
+
+    def search(query, *args, **kwargs):
+        if query == raw_input:
+            raise RuntimeError("speculative search failed")
+        return []
+
+    memory.search = search
+    intent = AIMessage(content=json.dumps({"entities": [], "problem_class": "P", "search_query": "jug puzzle"}))
+    llm = GenericFakeChatModel(messages=iter([intent, AIMessage(content="answer")]))
+    app = build_ace_agent(llm, memory, use_tools=False)
+    state = {"messages": [HumanMessage(content=raw_input)], "context_docs": [],
+             "extracted_entities": [], "problem_class": "", "retry_count": 0}
+    try:
+        assert asyncio.run(app.ainvoke(state))["messages"][-1].content == "answer"
+        gc.collect()
+        assert "never retrieved" not in caplog.text
+    finally:
+        memory.clear()
@@ -1,6 +1,10 @@
 import pytest
+import os
 import uuid
+import faiss
+import numpy as np
 from ace_rm.ace_framework import ACE_Memory
+from ace_rm.memory import vector_index
 
 @pytest.fixture
 def memory():
@@ -27,3 +31,136 @@ def test_add_and_search(memory):
     # Test Get All
     all_docs = memory.get_all()
     assert len(all_docs) == 2
+    columns = memory.get_all_columnar()
+    assert columns["content"] == [d["content"] for d in all_docs]
+    assert list(columns) == list(all_docs[0])
+    assert memory.count() == 2
+    assert memory.get_all_columnar(limit=1)["content"] == [all_docs[0]["content"]]
+
+def test_find_by_entity_and_problem_class(memory):
+    memory.add("The capital of France is Paris.", entities=["France", "Paris"], problem_class="Geography")
+    memory.add("Use a context manager for files.", entities=["Python"], problem_class="Coding")
+
+    by_entity = memory.find_by_entity("Paris")
+    assert [d["content"] for d in by_entity] == ["The capital of France is Paris."]
+    assert memory.find_by_entity("Par") == []
+
+    by_class = memory.find_by_problem_class("Coding")
+    assert [d["content"] for d in by_class] == ["Use a context manager for files."]
+
+def test_flush_appends_to_change_log(memory):
+    memory.add("The capital of France is Paris.", entities=["France"], problem_class="Geography")
+    memory.flush()
+    assert os.path.getsize(memory.index_log_path) > 0
+
+    # Another instance on the same files replays the log; reopening folds it into the index file.
+    other = ACE_Memory(session_id=memory.session_id)
+    assert other.index.ntotal == 1
+    assert os.path.getsize(memory.index_log_path) == 0
+    memory.add("The capital of Japan is Tokyo.", entities=["Japan"], problem_class="Geography")
+    memory.flush()
+    assert other.search("Tokyo", k=1) == ["The capital of Japan is Tokyo."]
+    assert other.index.ntotal == 2
+
+    # add_many logs its batch too rather than rewriting the index file.
+    index_mtime = os.path.getmtime(memory.index_path)
+    ids = memory.add_many([("Rome is in Italy.", ["Italy"], "Geography"), ("Oslo is in Norway.", ["Norway"], "Geography")])
+    assert os.path.getmtime(memory.index_path) == index_mtime
+    assert other.find_similar_vectors("Oslo is in Norway.", threshold=0.9)[0][0] == ids[1]
+
+
+def test_data_version_changes_only_on_writes(memory):
+    version = memory.data_version
+    memory.get_all()
+    memory.search("anything")
+    assert memory.data_version == version
+    memory.add("The capital of Italy is Rome.", entities=["Italy"], problem_class="Geography")
+    assert memory.data_version > version
+    version = memory.data_version
+    memory.update_document(memory.get_all()[0]["id"], "The capital of Italy is Rome.", ["Italy", "Rome"], "Geography")
+    assert memory.data_version > version
+
+
+@pytest.mark.parametrize("index_type, size_setting", [
+    ("auto", "FAISS_AUTO_HNSW_MIN_SIZE"),
+    ("hnsw_sq8", "SQ8_MIN_TRAIN_SIZE"),
+])
+def test_flat_index_upgrades_to_hnsw_when_large(monkeypatch, index_type, size_setting):
+    monkeypatch.setattr(vector_index, size_setting, 64)
+    index = vector_index.create_index(8, "l2", index_type)
+    vectors = np.random.default_rng(0).standard_normal((64, 8)).astype(np.float32)
+    index.add_with_ids(vectors[:63], np.arange(63))
+    assert not vector_index.upgrade_due(index, index_type)
+
+    index.add_with_ids(vectors[63:], np.array([63]))
+    index = vector_index.maybe_upgrade_index(index, index_type)
+    base = faiss.downcast_index(index.index)
+    assert isinstance(base, faiss.IndexHNSW)
+    assert isinstance(base, faiss.IndexHNSWSQ) == (index_type == "hnsw_sq8")
+    assert index.search(vectors[5:6], 1)[1][0, 0] == 5
+
+    # Deletion rebuilds the graph with the same storage type.
+    index = vector_index.remove_ids(index, [5])
+    assert type(faiss.downcast_index(index.index)) is type(base)
+    assert index.ntotal == 63 and index.search(vectors[6:7], 1)[1][0, 0] == 6
+
+
+def test_hnsw_replace_leaves_tombstones_until_compaction(monkeypatch):
+    monkeypatch.setattr(vector_index, "HNSW_COMPACT_RATIO", 0.1)
+    index = vector_index.create_index(8, "l2", "hnsw")
+    vectors = np.random.default_rng(0).standard_normal((33, 8)).astype(np.float32)
+    index.add_with_ids(vectors[:32], np.arange(32))
+
+    # Replacing id 5 appends its new vector instead of rebuilding the graph.
+    same = vector_index.replace_vectors(index, np.array([5]), np.array([5]), vectors[32:])
+    assert same is index and index.ntotal == 33
+    tombstones = vector_index.Tombstones(index)
+    assert tombstones.count == 1
+    assert tombstones.search(vectors[5:6], 1)[1][0, 0] != 5
+    assert tombstones.search(vectors[32:], 1)[1][0, 0] == 5
+
+    assert vector_index.maybe_compact_index(index) is index
+    index = vector_index.replace_vectors(index, np.array([6, 7, 8]), np.array([6, 7, 8]), vectors[:3])
+    index = vector_index.maybe_compact_index(index)
+    assert index.ntotal == 32 and vector_index.Tombstones(index).count == 0
+    assert index.search(vectors[32:], 1)[1][0, 0] == 5
+
+
+def test_index_type_mismatch_converts_on_load(memory, monkeypatch):
+    memory.add("The capital of France is Paris.", entities=["France"], problem_class="Geography")
+    memory.flush()
+    assert isinstance(faiss.downcast_index(memory.index.index), faiss.IndexHNSWFlat)
+
+    monkeypatch.setattr(ACE_Memory, "_rebuild_vectors_from_db", lambda self: pytest.fail("re-embedded"))
+    monkeypatch.setattr("ace_rm.memory.core.FAISS_INDEX_TYPE", "flat")
+    flat = ACE_Memory(session_id=memory.session_id)
+    assert flat.index_type == "flat"
+    assert isinstance(faiss.downcast_index(flat.index.index), faiss.IndexFlat)
+    assert flat.search("France capital", k=1) == ["The capital of France is Paris."]
+
+
+def test_embedding_cache_persists_documents_only_and_is_bounded(memory):
+    memory._embedding_cache._max_rows = 2
+
+    def cached_rows():
+        return memory._pool.reader().execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0]
+
+    memory.add("Paris is in France.", entities=[], problem_class="Geography")
+    memory.search("France capital")
+    assert cached_rows() == 1
+    for content in ("Tokyo is in Japan.", "Rome is in Italy."):
+        memory.add(content, entities=[], problem_class="Geography")
+    assert cached_rows() == 2
+
+    memory.clear()
+    assert cached_rows() == 0
+
+
+
+def test_session_state_survives_reopen(memory):
+    assert memory.load_state("stm_model", {}) == {}
+    version = memory.data_version
+    memory.save_state("stm_model", {"entities": ["jug"], "constraints": [], "actions": []})
+    assert memory.data_version == version
+    reopened = ACE_Memory(session_id=memory.session_id)
+    assert reopened.load_state("stm_model")["entities"] == ["jug"]
@@ -0,0 +1,35 @@
+import numpy as np
+
+from ace_rm.utils.response_cache import SemanticResponseCache
+
+
+def test_near_duplicate_query_hits_within_same_context():
+    cache = SemanticResponseCache(threshold=0.95)
+    cache.store("detailed|h1", np.array([1.0, 0.0, 0.0]), {"response": "cached"})
+
+    assert cache.lookup("detailed|h1", np.array([0.99, 0.05, 0.0]))["response"] == "cached"
+    assert cache.lookup("detailed|h1", np.array([0.5, 0.5, 0.0])) is None  # Too dissimilar
+    assert cache.lookup("concise|h1", np.array([1.0, 0.0, 0.0])) is None  # Different context
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SemanticResponseCache(threshold=0.9, maxsize=2)
+    cache.store("k", np.array([1.0, 0.0]), {"response": "a"})
+    cache.store("k", np.array([0.0, 1.0]), {"response": "b"})
+    assert cache.lookup("k", np.array([1.0, 0.0]))["response"] == "a"  # Refreshes "a"
+    cache.store("k", np.array([-1.0, 0.0]), {"response": "c"})
+
+    assert len(cache) == 2
+    assert cache.lookup("k", np.array([0.0, 1.0])) is None
+
+
+def test_int8_quantized_cache_matches_float_decisions():
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((8, 384)).astype(np.float32)
+    cache = SemanticResponseCache(threshold=0.95, quantize=True)
+    for i, vector in enumerate(vectors):
+        cache.store("k", vector, {"response": i})
+
+    for i, vector in enumerate(vectors):
+        assert cache.lookup("k", vector + 0.01 * rng.standard_normal(384))["response"] == i
+    assert cache.lookup("k", rng.standard_normal(384)) is None
@@ -0,0 +1,57 @@
+import threading
+
+from ace_rm.utils.session_cache import SessionCache
+
+
+def test_least_recently_used_entry_is_evicted():
+    evicted = []
+    cache = SessionCache(maxsize=2, ttl=3600, on_evict=lambda k, v: evicted.append(k))
+    cache.get_or_create("a", lambda: 1)
+    cache.get_or_create("b", lambda: 2)
+    assert cache.get_or_create("a", lambda: -1) == 1  # Refreshes "a"
+    cache.get_or_create("c", lambda: 3)
+
+    assert evicted == ["b"]
+    assert "a" in cache and "c" in cache and len(cache) == 2
+
+
+def test_idle_entries_expire_and_are_recreated(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("ace_rm.utils.session_cache.time.monotonic", lambda: now[0])
+    evicted = []
+    cache = SessionCache(maxsize=8, ttl=10, on_evict=lambda k, v: evicted.append((k, v)))
+    cache.get_or_create("a", lambda: "old")
+    cache.get_or_create("b", lambda: "b")
+
+    now[0] = 105.0
+    cache.get_or_create("b", lambda: "unused")
+    now[0] = 112.0
+    assert cache.get_or_create("a", lambda: "new") == "new"
+
+    assert evicted == [("a", "old")]
+    assert "b" in cache
+
+
+def test_slow_creation_blocks_only_the_same_key():
+    started, release = threading.Event(), threading.Event()
+    built = []
+
+    def slow_factory():
+        built.append("a")
+        started.set()
+        release.wait(5)
+        return "a"
+
+    cache = SessionCache(maxsize=8, ttl=3600)
+    first = threading.Thread(target=cache.get_or_create, args=("a", slow_factory))
+    second = threading.Thread(target=cache.get_or_create, args=("a", slow_factory))
+    first.start()
+    assert started.wait(5)
+    second.start()
+
+    # "a" is still being built; other keys are unaffected.
+    assert cache.get_or_create("b", lambda: "b") == "b"
+    release.set()
+    first.join(5)
+    second.join(5)
+    assert built == ["a"] and cache.get_or_create("a", lambda: "unused") == "a"